@@ -0,0 +1,73 @@
+"""
+Latency of lookups in a catalogue of a university's worth of subjects,
+synthesised from the offerings of the test_data fixtures
+
+Run from the root of the repository with `python -m benchmarks.catalogue`.
+"""
+
+import os
+import tempfile
+import time
+
+import test_data
+from catalogue import Catalogue
+
+FIXTURES = ["two_subjects", "abpl10003_sm1", "abpl10003_sm2", "andy"]
+AREAS = ["ABPL", "ACCT", "BIOL", "CHEM", "COMP", "ECON", "ENGR", "FINA",
+    "HIST", "LAWS", "MAST", "MGMT", "PHYC", "POLS", "PSYC", "SWEN"]
+SUBJECTS_PER_AREA = 500
+LOOKUPS = 10000
+
+QUERIES = [
+    ("get", LOOKUPS, lambda catalogue: catalogue.get("COMP20003")),
+    ("prefix COMP2", LOOKUPS, lambda catalogue: catalogue.prefix("COMP2")),
+    ("search comp 2000x", LOOKUPS,
+        lambda catalogue: catalogue.search("comp 2000x")),
+    ("search fuzzy", LOOKUPS // 100,
+        lambda catalogue: catalogue.search("COPM20003")),
+    ("subjects SM2 Parkville", LOOKUPS // 10,
+        lambda catalogue: catalogue.subjects("SM2", "Parkville")),
+]
+
+
+def synthetic_catalogue():
+    """The subjects of the fixtures, and their offerings cycled over made-up
+    subject codes"""
+    fixtures = Catalogue.from_timetables(subject_timetable
+        for name in FIXTURES for subject_timetable in getattr(test_data, name))
+    masks = fixtures.masks()
+    offerings = list(masks.values())
+
+    for area in AREAS:
+        for number in range(SUBJECTS_PER_AREA):
+            code = "%s%d%04d" % (area, number % 9 + 1, number)
+            masks[code] = offerings[len(masks) % len(offerings)]
+
+    return Catalogue(masks)
+
+
+def main():
+    start = time.perf_counter()
+    catalogue = synthetic_catalogue()
+    print("built %d subjects in %.1f ms" % (len(catalogue),
+        (time.perf_counter() - start) * 1000))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "subjects.cat")
+        catalogue.save(path)
+        start = time.perf_counter()
+        catalogue = Catalogue.load(path)
+        print("loaded %d bytes in %.1f ms" % (os.path.getsize(path),
+            (time.perf_counter() - start) * 1000))
+
+    for name, lookups, query in QUERIES:
+        query(catalogue) # the first query builds the posting lists
+        start = time.perf_counter()
+        for _ in range(lookups):
+            query(catalogue)
+        print("%-24s %8.2f us" % (name,
+            (time.perf_counter() - start) / lookups * 1e6))
+
+
+if __name__ == "__main__":
+    main()
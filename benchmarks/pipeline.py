@@ -0,0 +1,182 @@
+"""
+Throughput and peak memory of each stage of the pipeline: fetching from a
+local stand-in of SWS, parsing with each parser, laying out and rendering,
+on the test_data fixtures scaled up to large reports
+
+The peak is of the Python heap, as traced by tracemalloc, which misses the
+memory of C libraries such as libxml2; the parse stages also report the
+growth of the resident set, which counts it.
+
+Run from the root of the repository with `python -m benchmarks.pipeline`,
+optionally followed by the scales to run at.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import metrics
+import parsers
+import plot
+import test_data
+from benchmarks import sws
+from records import ClassRecord
+from timetable import Timetable
+
+DEFAULT_SCALES = [10, 100, 1000]
+MAX_SOUP_SCALE = 100 # BeautifulSoup is too slow for the largest reports
+FETCHES = 50
+RENDERS = 20
+
+# parses a report file as parse() does, after the parser's imports (but not
+# those of the other stages, which would raise the peak), printing the
+# growth of the peak resident set. The peak is read from /proc (on Linux), as
+# ru_maxrss keeps the peak of the process forked to run the script
+_RSS_SCRIPT = """
+import sys
+
+import parsers
+from records import ClassRecord
+
+
+def peak_rss():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+
+parser = parsers.get_parser(sys.argv[1])
+with open(sys.argv[2], "rb") as report_file:
+    content = report_file.read()
+list(parser(b"<html><body></body></html>"))
+start = peak_rss()
+[ClassRecord.from_row(row) for row in parser(content)]
+print(peak_rss() - start)
+"""
+
+
+def measure(function, repeats = 1):
+    """Return the seconds per call and the peak bytes allocated by a call,
+    timed and traced in separate passes so tracing does not skew timing"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    seconds = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def measure_rss(content, parser):
+    """Return the bytes the peak resident set grows by in parsing the
+    content, in a fresh interpreter so that no memory freed by earlier
+    stages is reused"""
+    import subprocess
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix = ".html") as report_file:
+        report_file.write(content)
+        report_file.flush()
+        output = subprocess.run([sys.executable, "-c", _RSS_SCRIPT, parser,
+            report_file.name], stdout = subprocess.PIPE, check = True).stdout
+
+    return int(output)
+
+
+def report(stage, seconds, peak, items, unit, rss = None):
+    print("%-26s %10.2f ms %12.0f %s/s %10.1f MiB py heap" % (stage,
+        seconds * 1000, items / seconds, unit, peak / 2 ** 20)
+        + ("" if rss is None else " %10.1f MiB RSS" % (rss / 2 ** 20)))
+
+
+def parse(content, parser):
+    return [ClassRecord.from_row(row)
+        for row in parsers.get_parser(parser)(content)]
+
+
+def bench_fetch():
+    subjects = sws.fixture_subjects()
+    with sws.StubServer(subjects):
+        session = Timetable.session()
+        Timetable.get(2016, "SM2", "COMP20003", session = session)
+
+        for name, fetch in [
+                ("fetch get", lambda: [Timetable.get(2016, "SM2", subject,
+                    session = session) for subject in subjects]),
+                ("fetch get_many", lambda: Timetable.get_many(2016, "SM2",
+                    subjects, session = session))]:
+            seconds, peak = measure(fetch, FETCHES)
+            report(name, seconds, peak, len(subjects), "subjects")
+
+
+def bench_parse(scales):
+    classes = sws.fixture_subjects()["COMP20003"]
+    for scale in scales:
+        content = sws.report({"COMP20003":
+            sws.scaled_classes(classes, scale)})
+        rows = scale * len(classes)
+        for parser in ["lxml", "soup"]:
+            if parser == "soup" and scale > MAX_SOUP_SCALE:
+                continue
+            seconds, peak = measure(lambda: parse(content, parser))
+            rss = measure_rss(content, parser)
+            report("parse %s x%d" % (parser, scale), seconds, peak,
+                rows, "rows", rss)
+        print("%-26s %10.1f MiB" % ("  report size", len(content) / 2 ** 20))
+
+
+def bench_layout(scales):
+    from layout import layout_classes
+
+    classes = [ClassRecord.from_dict(class_)
+        for _, subject_classes in test_data.andy
+        for class_ in subject_classes]
+    for scale in scales:
+        scaled = classes * scale
+        seconds, peak = measure(lambda: layout_classes(scaled))
+        report("layout x%d" % scale, seconds, peak, len(scaled), "classes")
+
+
+def bench_render():
+    for renderer in ["svg", "matplotlib"]:
+        plot.draw_timetable(test_data.andy, "svg", renderer = renderer)
+        seconds, peak = measure(lambda: plot.draw_timetable(test_data.andy,
+            "svg", renderer = renderer), RENDERS)
+        report("render %s" % renderer, seconds, peak, 1, "renders")
+
+
+def bench_hooks():
+    """The totals of the stages of fetching and drawing the fixtures, as
+    reported by the metrics hooks"""
+    recorder = metrics.Recorder()
+    with sws.StubServer():
+        metrics.add_hook(recorder)
+        try:
+            for subject_timetables in [test_data.two_subjects,
+                    test_data.abpl10003_sm2, test_data.andy]:
+                subjects = [subject for subject, _ in subject_timetables]
+                plot.draw_timetable(plot.fetch_timetables(subjects), "svg")
+        finally:
+            metrics.remove_hook(recorder)
+
+    print(recorder.report())
+
+
+def main():
+    scales = [int(scale) for scale in sys.argv[1:]] or DEFAULT_SCALES
+
+    bench_fetch()
+    bench_parse(scales)
+    bench_layout(scales)
+    bench_render()
+    print()
+    bench_hooks()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Memory and throughput of the class representations, on the test_data
+fixtures scaled up to a faculty-sized set of classes
+
+Run from the root of the repository with `python -m benchmarks.records`.
+"""
+
+import time
+import tracemalloc
+
+import test_data
+from records import ClassRecord, ClassTable
+from timetable import CLASS_ROW_HEADERS, CLASS_CODES
+
+FIXTURES = ["two_subjects", "abpl10003_sm1", "abpl10003_sm2", "andy"]
+SCALE = 200
+
+
+def fixture_classes():
+    classes = []
+    for name in FIXTURES:
+        for _, subject_classes in getattr(test_data, name):
+            classes += subject_classes
+
+    return classes
+
+
+def fixture_rows(classes, scale = SCALE):
+    """Yield the cells of the report rows the fixtures were parsed from
+
+    Each row is made of fresh strings, as a parser would produce them.
+    """
+    for _ in range(scale):
+        for class_ in classes:
+            cells = dict(class_)
+            cells["class"] = "/".join(class_["class"][code]
+                for code in CLASS_CODES)
+            cells["day"] = ["Monday", "Tuesday", "Wednesday", "Thursday",
+                "Friday", "Saturday", "Sunday"][class_["day"]]
+            cells["start"] = "%02d:%02d" % class_["start"]
+            cells["finish"] = "%02d:%02d" % class_["finish"]
+            yield ["".join(list(cells[header]))
+                for header in CLASS_ROW_HEADERS]
+
+
+def parse_dict(row):
+    # the previous per-class representation
+    from timetable import Time, Weekday
+
+    class_ = dict(zip(CLASS_ROW_HEADERS, row))
+    class_["day"] = Weekday.from_string(class_["day"]).to_num()
+    class_["start"] = Time.from_string(class_["start"]).to_tuple()
+    class_["finish"] = Time.from_string(class_["finish"]).to_tuple()
+    class_["class"] = dict(zip(CLASS_CODES, class_["class"].split("/")))
+    return class_
+
+
+def measure(name, build):
+    # time without tracing, which would dominate the timings
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = build()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%-12s %8d classes %8.1f ms %10.0f classes/s %8.1f bytes/class "
+        "(peak %.1f MB)" % (name, len(result), elapsed * 1000,
+            len(result) / elapsed, size / len(result), peak / 2 ** 20))
+    return result
+
+
+def main():
+    classes = fixture_classes()
+
+    # rows are generated while measuring, so the memory retained by each
+    # representation includes the strings it keeps
+    measure("dict", lambda: [parse_dict(row)
+        for row in fixture_rows(classes)])
+    records = measure("ClassRecord", lambda: [ClassRecord.from_row(row)
+        for row in fixture_rows(classes)])
+    measure("ClassTable", lambda: ClassTable(records))
+
+
+if __name__ == "__main__":
+    main()
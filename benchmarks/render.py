@@ -0,0 +1,95 @@
+"""
+Latency of the renderers, and throughput and memory of rendering many
+timetables, on the test_data fixtures
+
+Run from the root of the repository with `python -m benchmarks.render`,
+optionally followed by the number of renders and of workers.
+"""
+
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import plot
+import test_data
+
+FIXTURES = ["two_subjects", "abpl10003_sm1", "abpl10003_sm2", "andy"]
+DEFAULT_RENDERS = 1000
+CHECKPOINTS = 5
+LATENCY_RENDERS = 20
+
+
+def jobs(renders):
+    fixtures = [getattr(test_data, name) for name in FIXTURES]
+    for index in range(renders):
+        yield fixtures[index % len(fixtures)]
+
+
+def bench_renderers():
+    for renderer in ["svg", "matplotlib"]:
+        # the first render includes the imports of the renderer
+        start = time.perf_counter()
+        plot.draw_timetable(test_data.andy, "svg", renderer = renderer)
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for subject_timetables in jobs(LATENCY_RENDERS):
+            plot.draw_timetable(subject_timetables, "svg",
+                renderer = renderer)
+        elapsed = (time.perf_counter() - start) / LATENCY_RENDERS
+
+        print("  %-10s svg  first render %8.2f ms, then %8.2f ms per render"
+            % (renderer, first * 1000, elapsed * 1000))
+
+
+def bench_serial(renders, format):
+    # the memory still allocated should stay flat as the renders go on
+    plot._init_render_worker()
+    tracemalloc.start()
+    start = time.perf_counter()
+    checkpoint = max(1, renders // CHECKPOINTS)
+    for index, subject_timetables in enumerate(jobs(renders)):
+        plot.draw_timetable(subject_timetables, format,
+            renderer = "matplotlib")
+        done = index + 1
+        if done % checkpoint == 0:
+            size, _ = tracemalloc.get_traced_memory()
+            print("  serial %-4s %6d renders %8.1f renders/s %8.1f MB held"
+                % (format, done, done / (time.perf_counter() - start),
+                    size / 2 ** 20))
+    tracemalloc.stop()
+
+
+def bench_parallel(renders, workers, format):
+    # matplotlib renders, which the pool is for
+    start = time.perf_counter()
+    checkpoint = max(1, renders // CHECKPOINTS)
+    total_bytes = 0
+    for done, (_, image) in enumerate(
+            plot.render_many(jobs(renders), workers, format, "matplotlib"),
+            1):
+        total_bytes += len(image)
+        if done % checkpoint == 0:
+            print("  pool   %-4s %6d renders %8.1f renders/s %8.1f MB output"
+                % (format, done, done / (time.perf_counter() - start),
+                    total_bytes / 2 ** 20))
+
+    # (kilobytes on Linux)
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print("  pool   %-4s max worker RSS %.1f MB" % (format, max_rss / 1024))
+
+
+def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RENDERS
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    bench_renderers()
+    for format in plot.SUPPORTED_OUTPUT_FORMATS:
+        bench_serial(renders // 10, format)
+        bench_parallel(renders, workers, format)
+
+
+if __name__ == "__main__":
+    main()
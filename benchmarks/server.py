@@ -0,0 +1,153 @@
+"""
+Load test of the timetable server against a local stand-in of SWS: latency
+percentiles and throughput of many concurrent clients, and the upstream
+fetches saved by coalescing
+
+Run from the root of the repository with `python -m benchmarks.server`,
+optionally followed by the number of clients and of requests.
+"""
+
+import asyncio
+import collections
+import itertools
+import sys
+import threading
+import time
+
+import test_data
+from benchmarks import sws
+from cache import TimetableCache
+from server import TimetableServer
+
+DEFAULT_CLIENTS = 50
+DEFAULT_REQUESTS = 2000
+UPSTREAM_LATENCY = 0.05 # seconds, of each response of the stand-in
+
+
+def fixture_keys():
+    """The (year, semester, code) of each subject in the fixtures"""
+    return list(collections.OrderedDict.fromkeys(subject
+        for name in sws.FIXTURES for subject, _ in getattr(test_data, name)))
+
+
+def query(subjects):
+    return "subjects=" + ",".join("%s:%s:%s" % subject
+        for subject in subjects)
+
+
+class ServerThread:
+    """Run a TimetableServer on an event loop of its own thread, so the
+    clients do not share its loop"""
+
+    def __init__(self, **options):
+        self.server = TimetableServer(**options)
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target = self.__loop.run_forever,
+            daemon = True)
+
+
+    def __enter__(self):
+        self.__thread.start()
+        listening = asyncio.run_coroutine_threadsafe(
+            self.server.start(port = 0), self.__loop).result()
+        self.port = listening.sockets[0].getsockname()[1]
+        return self
+
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self.server.close(),
+            self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+
+
+async def get(reader, writer, target):
+    """Send a GET on a keep-alive connection, and return the status and
+    body of the response"""
+    writer.write(("GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        % target).encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+
+    return status, await reader.readexactly(length)
+
+
+async def load(port, targets, clients):
+    """Request the targets from the clients, each over one connection, and
+    return the latencies of the requests and the seconds taken"""
+    targets = iter(targets)
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for target in targets:
+                start = time.perf_counter()
+                status, _ = await get(reader, writer, target)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    raise Exception("%s returned %d" % (target, status))
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    return latencies, time.perf_counter() - start
+
+
+def report(name, stub, latencies, seconds):
+    latencies = sorted(latencies)
+    print("%-26s %6d requests %8.1f ms p50 %8.1f ms p99 %8.0f req/s "
+        "%6d upstream" % (name, len(latencies),
+        latencies[len(latencies) // 2] * 1000,
+        latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+            * 1000,
+        len(latencies) / seconds, stub.requests))
+    stub.requests = 0
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CLIENTS
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REQUESTS
+
+    subjects = fixture_keys()
+    pairs = list(itertools.combinations(subjects, 2))
+    triples = list(itertools.combinations(subjects, 3))
+
+    with sws.StubServer(latency = UPSTREAM_LATENCY) as stub:
+        with ServerThread(cache = TimetableCache()) as server:
+            # every client asks for the same subjects at once
+            latencies, seconds = asyncio.run(load(server.port,
+                ["/timetables?" + query(subjects)] * clients, clients))
+            report("coalesced timetables", stub, latencies, seconds)
+
+            # the timetables are now cached, so the rest is drawing and
+            # solving
+            for name, targets in [
+                    ("svg cold", ["/timetable.svg?" + query(triple)
+                        for triple in triples]),
+                    ("svg warm", ["/timetable.svg?" + query(triple)
+                        for triple in itertools.islice(
+                            itertools.cycle(triples), requests)]),
+                    ("png cold", ["/timetable.png?" + query(pair)
+                        for pair in pairs]),
+                    ("solve days", ["/solve?objective=days&" + query(pair)
+                        for pair in itertools.islice(
+                            itertools.cycle(pairs), requests // 10)])]:
+                latencies, seconds = asyncio.run(load(server.port,
+                    targets, clients))
+                report(name, stub, latencies, seconds)
+
+
+if __name__ == "__main__":
+    main()
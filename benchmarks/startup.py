@@ -0,0 +1,79 @@
+"""
+Cold start time of the command line interface, and the heavy dependencies
+each command imports
+
+Run from the root of the repository with `python -m benchmarks.startup`.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import records
+import test_data
+
+HEAVY_MODULES = ["requests", "bs4", "lxml", "matplotlib", "numpy"]
+RUNS = 5
+
+
+def import_time(arguments):
+    """Return the total import time in microseconds, as -X importtime
+    reports it, and the heavy modules imported"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-m",
+        "unimelb_timetable"] + arguments, stdout = subprocess.DEVNULL,
+        stderr = subprocess.PIPE, universal_newlines = True)
+
+    total = 0
+    heavy = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            own, _, module = line[len("import time:"):].split("|")
+            total += int(own)
+        except ValueError:
+            continue # the header
+        if module.strip() in HEAVY_MODULES:
+            heavy.add(module.strip())
+
+    return total, sorted(heavy)
+
+
+def wall_time(arguments):
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "unimelb_timetable"]
+            + arguments, stdout = subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        timetables = os.path.join(directory, "timetables.json")
+        with open(timetables, "w") as output:
+            json.dump(records.timetables_to_json(test_data.andy),
+                output)
+
+        commands = [
+            ["--help"],
+            ["draw", "-i", timetables],
+            ["draw", "-i", timetables, "--format", "png"],
+            ["solve", "-i", timetables, "--allow-clashes", "L"],
+        ]
+        for arguments in commands:
+            imports, heavy = import_time(arguments)
+            print("%-40s %8.1f ms wall %8.1f ms imports, heavy: %s"
+                % (" ".join(arguments).replace(timetables, "FILE"),
+                    wall_time(arguments) * 1000, imports / 1000,
+                    ", ".join(heavy) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+A local stand-in for the SWS reports, serving the cyon_table HTML of the
+test_data fixtures, or of synthetic scaled-up subjects
+"""
+
+import html
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import test_data
+import timetable
+from timetable import CLASS_CODES, CLASS_ROW_HEADERS, Weekday
+
+FIXTURES = ["two_subjects", "abpl10003_sm1", "abpl10003_sm2", "andy"]
+
+
+def fixture_subjects():
+    """The classes of each subject code in the fixtures"""
+    subjects = {}
+    for name in FIXTURES:
+        for (_, _, code), classes in getattr(test_data, name):
+            subjects.setdefault(code.upper(), []).extend(classes)
+
+    return subjects
+
+
+def scaled_classes(classes, scale):
+    """The classes repeated scale times, as distinct class repeats"""
+    scaled = []
+    for copy in range(scale):
+        for class_ in classes:
+            class_ = dict(class_)
+            class_["class"] = dict(class_["class"], class_repeat = "%s%d"
+                % (class_["class"]["class_repeat"], copy))
+            scaled.append(class_)
+
+    return scaled
+
+
+def report(classes_by_subject):
+    """The HTML of a report of the subjects, one cyon_table each"""
+    page = ["<html><head><meta charset='utf-8'></head><body>"]
+    for classes in classes_by_subject.values():
+        page.append("<table class='cyon_table'><thead><tr>%s</tr></thead>"
+            "<tbody>" % "".join("<th>%s</th>" % header
+                for header in CLASS_ROW_HEADERS))
+        for class_ in classes:
+            cells = dict(class_)
+            cells["class"] = "/".join(class_["class"][code]
+                for code in CLASS_CODES)
+            cells["day"] = Weekday.WEEKDAYS[class_["day"]].title()
+            cells["start"] = "%02d:%02d" % tuple(class_["start"])
+            cells["finish"] = "%02d:%02d" % tuple(class_["finish"])
+            page.append("<tr>%s</tr>" % "".join("<td>%s</td>"
+                % html.escape(cells[header] or "")
+                for header in CLASS_ROW_HEADERS))
+        page.append("</tbody></table>")
+    page.append("</body></html>")
+
+    return "".join(page).encode("utf-8")
+
+
+class StubServer:
+    """Serve reports of the subjects on a local port, and point the links of
+    the timetable module at it while in a with block"""
+
+    def __init__(self, subjects = None, etag = '"stub"', latency = 0,
+    failures = 0, last_modified = None):
+        self.subjects = subjects if subjects is not None \
+            else fixture_subjects()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.latency = latency # seconds, before each response
+        self.failures = failures # the first requests answered with a 503
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    failure = stub.requests <= stub.failures
+                time.sleep(stub.latency)
+
+                if failure:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if (stub.etag
+                        and self.headers.get("If-None-Match") == stub.etag
+                        or stub.last_modified and self.headers.get(
+                            "If-Modified-Since") == stub.last_modified):
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                query = urllib.parse.parse_qs(
+                    urllib.parse.urlparse(self.path).query)
+                codes = [code.strip().upper() for code
+                    in query.get("objects", [""])[0].splitlines()
+                    if code.strip()]
+                body = report(dict((code, stub.subjects.get(code, []))
+                    for code in codes))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if stub.etag:
+                    self.send_header("ETag", stub.etag)
+                if stub.last_modified:
+                    self.send_header("Last-Modified", stub.last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__server.daemon_threads = True
+
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.__server.server_port
+
+
+    def __enter__(self):
+        threading.Thread(target = self.__server.serve_forever,
+            daemon = True).start()
+        self.__link = timetable.TIMETALBE_LINK
+        timetable.TIMETALBE_LINK = self.__link.replace(
+            "https://sws.unimelb.edu.au", self.url)
+        return self
+
+
+    def __exit__(self, *exc_info):
+        timetable.TIMETALBE_LINK = self.__link
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,186 @@
+"""
+A cache for parsed timetables, with an in-process memory tier in front of an
+on-disk SQLite tier
+"""
+
+import collections
+import pickle
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 24 * 60 * 60 # seconds
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024 # size bound of the disk tier
+DEFAULT_MEMORY_ENTRIES = 256
+
+CacheEntry = collections.namedtuple("CacheEntry",
+    ["classes", "etag", "last_modified", "fetched_at"])
+
+
+class TimetableCache:
+    """A size-bounded LRU cache of parsed class lists
+
+    Entries are kept in memory for the most recently used keys, and in a
+    SQLite file if a path is given. Entries older than the TTL are stale, and
+    are revalidated against the upstream with the ETag or Last-Modified
+    they were stored with.
+    """
+
+    def __init__(self, path = None, ttl = DEFAULT_TTL,
+    max_bytes = DEFAULT_MAX_BYTES, memory_entries = DEFAULT_MEMORY_ENTRIES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+
+        self.__memory = collections.OrderedDict()
+        self.__touched = {} # access times not yet written to the disk tier
+        self.__lock = threading.Lock()
+        self.__db = None
+        if path is not None:
+            self.__db = sqlite3.connect(path, check_same_thread = False)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, data BLOB, etag TEXT, "
+                "last_modified TEXT, fetched_at REAL, accessed_at REAL, "
+                "size INTEGER)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS entries_accessed "
+                "ON entries (accessed_at)")
+            self.__db.commit()
+
+
+    @staticmethod
+    def key(url, semester):
+        return "%s#%s" % (url, semester.upper())
+
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl
+
+
+    def get(self, key):
+        """Return the entry of the key, or None if it is not cached"""
+        with self.__lock:
+            entry = self.__memory.get(key)
+            if entry is not None:
+                self.__memory.move_to_end(key)
+                if self.__db is not None:
+                    self.__touched[key] = time.time()
+                return entry
+
+            if self.__db is None:
+                return None
+
+            row = self.__db.execute("SELECT data, etag, last_modified, "
+                "fetched_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            data, etag, last_modified, fetched_at = row
+            entry = CacheEntry(pickle.loads(data), etag, last_modified,
+                fetched_at)
+            self.__touched[key] = time.time()
+            self.__remember(key, entry)
+            return entry
+
+
+    def put(self, key, classes, etag = None, last_modified = None):
+        entry = CacheEntry(classes, etag, last_modified, time.time())
+        with self.__lock:
+            self.__remember(key, entry)
+            self.__touched.pop(key, None)
+            if self.__db is not None:
+                data = pickle.dumps(classes, pickle.HIGHEST_PROTOCOL)
+                self.__db.execute("INSERT OR REPLACE INTO entries VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?)",
+                    (key, data, etag, last_modified, entry.fetched_at,
+                        entry.fetched_at, len(data)))
+                self.__evict()
+                self.__db.commit()
+
+        return entry
+
+
+    def revalidated(self, key):
+        """Mark the entry of the key as fresh again, e.g. after a 304"""
+        entry = self.get(key)
+        if entry is None:
+            return None
+
+        entry = entry._replace(fetched_at = time.time())
+        with self.__lock:
+            self.__remember(key, entry)
+            if self.__db is not None:
+                self.__db.execute("UPDATE entries SET fetched_at = ? "
+                    "WHERE key = ?", (entry.fetched_at, key))
+                self.__db.commit()
+
+        return entry
+
+
+    def entries(self):
+        """Yield the (key, entry) of every cached entry, fresh or stale,
+        without marking them as used"""
+        with self.__lock:
+            entries = collections.OrderedDict(self.__memory)
+            rows = []
+            if self.__db is not None:
+                rows = self.__db.execute("SELECT key, data, etag, "
+                    "last_modified, fetched_at FROM entries").fetchall()
+
+        for key, entry in entries.items():
+            yield (key, entry)
+        for key, data, etag, last_modified, fetched_at in rows:
+            if key not in entries:
+                yield (key, CacheEntry(pickle.loads(data), etag,
+                    last_modified, fetched_at))
+
+
+    def clear(self):
+        with self.__lock:
+            self.__memory.clear()
+            self.__touched.clear()
+            if self.__db is not None:
+                self.__db.execute("DELETE FROM entries")
+                self.__db.commit()
+
+
+    def close(self):
+        with self.__lock:
+            if self.__db is not None:
+                self.__flush_touched()
+                self.__db.commit()
+                self.__db.close()
+                self.__db = None
+
+
+    def __remember(self, key, entry):
+        self.__memory[key] = entry
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.memory_entries:
+            self.__memory.popitem(last = False)
+
+
+    def __flush_touched(self):
+        self.__db.executemany("UPDATE entries SET accessed_at = ? "
+            "WHERE key = ?",
+            [(accessed_at, key)
+                for key, accessed_at in self.__touched.items()])
+        self.__touched.clear()
+
+
+    def __evict(self):
+        self.__flush_touched()
+
+        # drop the least recently used entries until the size bound is met
+        (total,) = self.__db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+
+        rows = self.__db.execute("SELECT key, size FROM entries "
+            "ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.__db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.__memory.pop(key, None)
+            total -= size
@@ -0,0 +1,307 @@
+"""
+An offline catalogue of subjects: the semesters, campuses and class types
+each subject is offered in, harvested from fetched or cached timetables, for
+prefix and fuzzy lookups of subject codes without touching the network
+"""
+
+import bisect
+import collections
+import re
+import string
+import struct
+from array import array
+
+from subject_codes import CAMPUSES, CLASS_TYPES, SEMESTERS
+
+# the bits of the masks of a subject are the indexes of these codes
+SEMESTER_CODES = sorted(SEMESTERS)
+CAMPUS_CODES = sorted(CAMPUSES)
+CLASS_TYPE_CODES = sorted(CLASS_TYPES)
+
+DEFAULT_LIMIT = 10
+FUZZY_CUTOFF = 0.6
+FUZZY_AREAS = 3 # the closest areas of a query searched for fuzzy matches
+MIN_EDIT = 2 # the shortest typo edit matched as a prefix
+MAGIC = b"UMCAT1"
+
+Offering = collections.namedtuple("Offering",
+    ["code", "semesters", "campuses", "class_types"])
+
+# the type of a class, e.g. "W" of "W01"
+_CLASS_TYPE = re.compile("[A-Z]+")
+_ALPHABET = string.ascii_uppercase + string.digits
+
+
+def _bit(codes, code):
+    try:
+        return 1 << codes.index(code)
+    except ValueError:
+        return 0
+
+
+def _codes(codes, mask):
+    return [code for index, code in enumerate(codes) if mask >> index & 1]
+
+
+def _lookup(codes, names, code_or_name):
+    """The bit of a code, or of a name in the decoding table, e.g. "SM2" or
+    "Semester 2" """
+    code_or_name = code_or_name.strip()
+    if code_or_name.upper() in codes:
+        return _bit(codes, code_or_name.upper())
+    for code, name in names.items():
+        if name.lower() == code_or_name.lower():
+            return _bit(codes, code)
+
+    raise Exception("Unknown code \"%s\"" % code_or_name)
+
+
+def _edits(query):
+    """Yield the strings one deletion, transposition, replacement or
+    insertion away from the query"""
+    splits = [(query[:index], query[index:])
+        for index in range(len(query) + 1)]
+    for head, tail in splits:
+        if tail:
+            yield head + tail[1:]
+        if len(tail) > 1:
+            yield head + tail[1] + tail[0] + tail[2:]
+        for char in _ALPHABET:
+            if tail and char != tail[0]:
+                yield head + char + tail[1:]
+            yield head + char + tail
+
+
+def normalize(query):
+    """Upper case the query and drop its whitespace, e.g. "comp 2000x" to
+    "COMP2000X" """
+    return "".join(query.split()).upper()
+
+
+class Catalogue:
+    """The offerings of subjects, kept as parallel arrays sorted by code
+
+    The semesters, campuses and class types of a subject are masks over
+    SEMESTER_CODES, CAMPUS_CODES and CLASS_TYPE_CODES. Codes not in the
+    tables of subject_codes are left out of the masks.
+    """
+
+    def __init__(self, masks = None):
+        masks = masks or {} # code -> (semesters, campuses, class types)
+        self.codes = sorted(masks)
+        self.semesters = array("I", [masks[code][0] for code in self.codes])
+        self.campuses = array("I", [masks[code][1] for code in self.codes])
+        self.class_types = array("I",
+            [masks[code][2] for code in self.codes])
+        self.__postings = None
+        self.__area_codes = None
+
+
+    @staticmethod
+    def from_timetables(subject_timetables, catalogue = None):
+        """Harvest the offerings of timetables, as returned by
+        plot.fetch_timetables, into a new catalogue, adding to the offerings
+        of the catalogue if one is given"""
+        masks = catalogue.masks() if catalogue is not None else {}
+        for _, classes in subject_timetables:
+            for class_ in classes:
+                codes = class_["class"]
+                code = codes["subject"].upper()
+                semesters, campuses, class_types = masks.get(code, (0, 0, 0))
+                class_type = _CLASS_TYPE.match(codes["class_type"].upper())
+                masks[code] = (
+                    semesters | _bit(SEMESTER_CODES, codes["semester"].upper()),
+                    campuses | _bit(CAMPUS_CODES, codes["campus"].upper()),
+                    class_types | (_bit(CLASS_TYPE_CODES, class_type.group())
+                        if class_type else 0))
+
+        return Catalogue(masks)
+
+
+    @staticmethod
+    def from_cache(cache, catalogue = None):
+        """Harvest every entry of a TimetableCache, fresh or stale"""
+        return Catalogue.from_timetables(
+            ((key, entry.classes) for key, entry in cache.entries()),
+            catalogue)
+
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as input_:
+            data = input_.read()
+
+        if not data.startswith(MAGIC):
+            raise Exception("\"%s\" is not a subject catalogue" % path)
+        (size,) = struct.unpack_from("<I", data, len(MAGIC))
+        offset = len(MAGIC) + 4
+        codes = data[offset:offset + size].decode("ascii").split("\n")
+        offset += size
+
+        catalogue = Catalogue()
+        catalogue.codes = [code for code in codes if code]
+        for name in ["semesters", "campuses", "class_types"]:
+            column = array("I")
+            column.frombytes(data[offset:offset
+                + len(catalogue.codes) * column.itemsize])
+            offset += len(catalogue.codes) * column.itemsize
+            setattr(catalogue, name, column)
+
+        return catalogue
+
+
+    def save(self, path):
+        """Write the catalogue as the sorted codes followed by the columns of
+        masks"""
+        codes = "\n".join(self.codes).encode("ascii")
+        with open(path, "wb") as output:
+            output.write(MAGIC + struct.pack("<I", len(codes)) + codes)
+            for column in [self.semesters, self.campuses, self.class_types]:
+                output.write(column.tobytes())
+
+
+    def masks(self):
+        return dict((code, (self.semesters[index], self.campuses[index],
+            self.class_types[index]))
+            for index, code in enumerate(self.codes))
+
+
+    def __len__(self):
+        return len(self.codes)
+
+
+    def __contains__(self, code):
+        return self.__index(normalize(code)) is not None
+
+
+    def get(self, code):
+        """Return the Offering of a subject code, or None if it is unknown"""
+        index = self.__index(normalize(code))
+        if index is None:
+            return None
+
+        return self.__offering(index)
+
+
+    def prefix(self, prefix, limit = DEFAULT_LIMIT):
+        """Return the codes starting with the prefix, in order"""
+        prefix = normalize(prefix)
+        first = bisect.bisect_left(self.codes, prefix)
+        last = bisect.bisect_left(self.codes, prefix + "\x7f", first)
+        if limit is not None:
+            last = min(last, first + limit)
+
+        return self.codes[first:last]
+
+
+    def search(self, query, limit = DEFAULT_LIMIT):
+        """Return the codes matching a query, e.g. "comp 2000x"
+
+        The query is matched as a prefix, ignoring case and whitespace, with
+        an "x" after the first digit matching any digit. With no such match,
+        the codes one typo away are returned instead, or failing that the
+        closest codes by difflib.
+        """
+        import difflib
+
+        query = normalize(query)
+        digits = re.search("[0-9]", query)
+        if digits is None or "X" not in query[digits.start():]:
+            matches = self.prefix(query, limit)
+        else:
+            literal = query[:query.index("X", digits.start())]
+            pattern = re.compile(re.escape(query[:digits.start()])
+                + "".join("[0-9]" if char == "X" else re.escape(char)
+                    for char in query[digits.start():]))
+            matches = [code for code in self.prefix(literal, None)
+                if pattern.match(code)][:limit]
+
+        if matches:
+            return matches
+
+        # the codes one typo away, e.g. COMP20003 of "COPM20003"
+        for edit in _edits(query):
+            if len(edit) < MIN_EDIT:
+                continue # a prefix of too many unrelated codes, e.g. ""
+            index = bisect.bisect_left(self.codes, edit)
+            while (index < len(self.codes) and len(matches) < limit
+                    and self.codes[index].startswith(edit)):
+                if self.codes[index] not in matches:
+                    matches.append(self.codes[index])
+                index += 1
+        if matches:
+            return sorted(matches)[:limit]
+
+        # match the codes of the closest areas, e.g. COMP of "COPM20003",
+        # rather than every code
+        area = re.match("[A-Z]*", query).group()
+        candidates = self.codes
+        if area:
+            areas = difflib.get_close_matches(area, self.__areas(),
+                FUZZY_AREAS, FUZZY_CUTOFF)
+            if areas:
+                candidates = [code for close in areas
+                    for code in self.prefix(close, None)]
+
+        return difflib.get_close_matches(query, candidates, limit,
+            FUZZY_CUTOFF)
+
+
+    def subjects(self, semester = None, campus = None, class_type = None):
+        """Return the codes of the subjects offered in the semester, at the
+        campus and with the class type, each a code or a name of the tables
+        of subject_codes, e.g. subjects("SM2", "Parkville")"""
+        indexes = None
+        for postings, codes, names, code_or_name in [
+                (0, SEMESTER_CODES, SEMESTERS, semester),
+                (1, CAMPUS_CODES, CAMPUSES, campus),
+                (2, CLASS_TYPE_CODES, CLASS_TYPES, class_type)]:
+            if code_or_name is None:
+                continue
+            bit = _lookup(codes, names, code_or_name).bit_length() - 1
+            matching = self.__posting_lists()[postings][bit]
+            indexes = matching if indexes is None else indexes & matching
+
+        if indexes is None:
+            return list(self.codes)
+
+        return [self.codes[index] for index in sorted(indexes)]
+
+
+    def __index(self, code):
+        index = bisect.bisect_left(self.codes, code)
+        if index < len(self.codes) and self.codes[index] == code:
+            return index
+
+        return None
+
+
+    def __offering(self, index):
+        return Offering(self.codes[index],
+            _codes(SEMESTER_CODES, self.semesters[index]),
+            _codes(CAMPUS_CODES, self.campuses[index]),
+            _codes(CLASS_TYPE_CODES, self.class_types[index]))
+
+
+    def __areas(self):
+        # the distinct letters of the codes, e.g. COMP of COMP20003
+        if self.__area_codes is None:
+            self.__area_codes = sorted(set(
+                re.match("[A-Z]*", code).group() for code in self.codes))
+
+        return self.__area_codes
+
+
+    def __posting_lists(self):
+        # the indexes of the subjects with each bit of each mask, built on
+        # the first query
+        if self.__postings is None:
+            self.__postings = []
+            for column, codes in [(self.semesters, SEMESTER_CODES),
+                    (self.campuses, CAMPUS_CODES),
+                    (self.class_types, CLASS_TYPE_CODES)]:
+                self.__postings.append([frozenset(index
+                    for index, mask in enumerate(column) if mask >> bit & 1)
+                    for bit in range(len(codes))])
+
+        return self.__postings
@@ -0,0 +1,62 @@
+"""
+Layout of clashing classes side by side in the columns of a timetable
+"""
+
+import collections
+import heapq
+
+Placement = collections.namedtuple("Placement",
+    ["stacking", "total_stacking"])
+
+
+def layout_classes(classes):
+    """Assign each class a lane among the classes it clashes with
+
+    The classes of each day are swept in order of their start, reusing the
+    lowest free lane, which takes the fewest lanes possible. Classes that
+    clash directly or through each other form a cluster, which shares the
+    number of lanes it needs as its total stacking.
+
+    Returns a list of Placements in the order of the classes, which are not
+    modified.
+    """
+    placements = [None] * len(classes)
+
+    classes_by_day = {}
+    for index, class_ in enumerate(classes):
+        classes_by_day.setdefault(class_["day"], []).append(
+            (class_["start"], class_["finish"], index))
+
+    for intervals in classes_by_day.values():
+        intervals.sort()
+
+        active = [] # heap of (finish, lane) of the classes still running
+        free_lanes = [] # heap of lanes freed within the cluster
+        cluster = [] # (index, lane) of the classes in the current cluster
+        lanes = 0
+        for start, finish, index in intervals:
+            while active and active[0][0] <= start:
+                heapq.heappush(free_lanes, heapq.heappop(active)[1])
+
+            # nothing is running, so a new cluster starts here
+            if not active and cluster:
+                _place_cluster(placements, cluster, lanes)
+                cluster, free_lanes, lanes = [], [], 0
+
+            if free_lanes:
+                lane = heapq.heappop(free_lanes)
+            else:
+                lane = lanes
+                lanes += 1
+
+            heapq.heappush(active, (finish, lane))
+            cluster.append((index, lane))
+
+        _place_cluster(placements, cluster, lanes)
+
+    return placements
+
+
+def _place_cluster(placements, cluster, lanes):
+    for index, lane in cluster:
+        placements[index] = Placement(lane, lanes)
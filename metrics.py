@@ -0,0 +1,89 @@
+"""
+Optional instrumentation of the fetch, parse, layout and render stages
+
+Hooks are registered with add_hook, and get the timings of the stages and
+the counts of the counters:
+
+    timing("fetch" | "parse" | "layout" | "render.<format>", seconds)
+    count("bytes_fetched" | "rows_parsed" | "classes_laid_out", n)
+
+With no hooks registered, the instrumentation costs next to nothing.
+"""
+
+import contextlib
+import threading
+import time
+
+_hooks = []
+
+
+class Metrics:
+    """The interface of a hook, which ignores everything by default"""
+
+    def timing(self, stage, seconds):
+        pass
+
+
+    def count(self, counter, n):
+        pass
+
+
+class Recorder(Metrics):
+    """A hook which totals the timings and counts, from any thread"""
+
+    def __init__(self):
+        self.timings = {} # stage -> [calls, seconds]
+        self.counters = {}
+        self.__lock = threading.Lock()
+
+
+    def timing(self, stage, seconds):
+        with self.__lock:
+            totals = self.timings.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+
+    def count(self, counter, n):
+        with self.__lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+
+    def report(self):
+        lines = ["%-16s %6d calls %10.2f ms" % (stage, calls, seconds * 1000)
+            for stage, (calls, seconds) in sorted(self.timings.items())]
+        lines += ["%-16s %12d" % (counter, n)
+            for counter, n in sorted(self.counters.items())]
+        return "\n".join(lines)
+
+
+def add_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def count(counter, n):
+    for hook in _hooks:
+        hook.count(counter, n)
+
+
+def timing(stage, seconds):
+    for hook in _hooks:
+        hook.timing(stage, seconds)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the block as the stage"""
+    if not _hooks:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing(name, time.perf_counter() - start)
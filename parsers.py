@@ -0,0 +1,80 @@
+"""
+Row parsers for the SWS timetable reports
+
+A parser takes the content of a report page and yields the cells of each row
+of its cyon_table tables, as lists of strings (None for a cell without a
+single string, like BeautifulSoup's `.string`).
+"""
+
+DEFAULT_PARSER = "lxml"
+TABLE_CLASS = "cyon_table"
+ENCODING = "utf-8" # of the reports, which do not always declare a charset
+
+
+def soup_rows(content):
+    """Parse rows with BeautifulSoup and the pure-Python html.parser"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "html.parser")
+    for table in soup.find_all("table", class_ = TABLE_CLASS):
+        for row in table.find("tbody").find_all("tr"):
+            # (plain strings, so the rows do not keep the soup alive)
+            yield [None if cell.string is None else str(cell.string)
+                for cell in row.find_all("td")]
+
+
+def lxml_rows(content):
+    """Parse rows incrementally with lxml, freeing each row after use"""
+    import io
+    from lxml import etree
+
+    for _, row in etree.iterparse(io.BytesIO(content), events = ("end",),
+            tag = "tr", html = True, encoding = ENCODING):
+        body = row.getparent()
+        table = body.getparent() if body is not None else None
+        if (body is None or body.tag != "tbody" or table is None
+                or table.tag != "table"
+                or TABLE_CLASS not in table.get("class", "").split()):
+            continue
+
+        yield [_cell_string(cell) for cell in row.iter("td")]
+
+        # free the row and the rows before it
+        row.clear()
+        while row.getprevious() is not None:
+            del body[0]
+
+
+def _cell_string(element):
+    # the equivalent of BeautifulSoup's `.string` for an lxml element
+    if len(element) == 0:
+        return element.text or None
+    if len(element) == 1 and not element.text and not element[0].tail:
+        return _cell_string(element[0])
+
+    return None
+
+
+PARSERS = {
+    "lxml": lxml_rows,
+    "soup": soup_rows
+}
+
+
+def get_parser(name = None):
+    """Return the row parser of the name, or the default one
+
+    The lxml parser falls back to BeautifulSoup if lxml is not installed.
+    """
+    if name is None:
+        name = DEFAULT_PARSER
+    if name not in PARSERS:
+        raise Exception("Unknown parser \"%s\"" % name)
+
+    if name == "lxml":
+        try:
+            import lxml.etree
+        except ImportError:
+            return soup_rows
+
+    return PARSERS[name]
@@ -4,45 +4,15 @@ A script for plotting for a timetable of selected subjects.
 
 DEFAULT_OUTPUT_FORMAT = "svg"
 SUPPORTED_OUTPUT_FORMATS = ["svg", "png"]
+DEFAULT_FETCH_WORKERS = 8
+RENDER_BACKEND = "Agg" # non-interactive matplotlib backend of render workers
+DEFAULT_RENDERER = "auto"
+SUPPORTED_RENDERERS = ["auto", "svg", "matplotlib"]
 
-
-def _stack_classes(classes):
-    # Calculate stacking of classes
-    classes_by_day = {} # group classes by day
-    for class_ in classes:
-        classes_by_day.setdefault(class_["day"], []).append(class_)
-
-    for day, classes_that_day in classes_by_day.items(): # process each weekday
-        # construct intervals
-        intervals = []
-        for class_ in classes_that_day:
-            intervals.append(class_["start"])
-            intervals.append(class_["finish"])
-        intervals.sort()
-        intervals_count = [0] * len(intervals) # parallel counter list
-
-        # stack classes on intervals
-        for class_ in classes_that_day:
-            start_index = intervals.index(class_["start"])
-            finish_index = intervals.index(class_["finish"])
-
-            max_level = max(intervals_count[index] for index in range(start_index, finish_index))
-
-            class_["stacking"] = max_level
-
-            # add one more level
-            for index in range(start_index, finish_index):
-                intervals_count[index] = max_level + 1
-
-
-        # retreive max stacking for each class
-        for class_ in classes_that_day:
-            start_index = intervals.index(class_["start"])
-            finish_index = intervals.index(class_["finish"])
-            class_["total_stacking"] = \
-                max(intervals_count[index] for index in range(start_index, finish_index))
-
-    return classes
+# Margins of the plot, in the units of the axes (days and hours)
+TIME_MARGIN = 0.3
+X_MARGIN = 0.015
+Y_MARGIN = 0.025
 
 
 def _flatten_classes(subject_timetables):
@@ -54,17 +24,18 @@ def _flatten_classes(subject_timetables):
     return all_classes
 
 
-def _plot_matplot(classes, start, finish, number_of_days,
+def _plot_matplot(classes, layout, start, finish, number_of_days,
 format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
-    import matplotlib.pyplot as plt
     from timetable import Weekday
 
-    TIME_MARGIN = 0.3
-    X_MARGIN = 0.015
-    Y_MARGIN = 0.025
-
     # Set axis
-    fig = plt.figure(figsize = (13, 10), facecolor = "white")
+    if show_plot:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize = (13, 10), facecolor = "white")
+    else:
+        # a figure outside of pyplot, which keeps no global state
+        from matplotlib.figure import Figure
+        fig = Figure(figsize = (13, 10), facecolor = "white")
     subplot = fig.add_subplot(1,1,1)
 
     # Set grids
@@ -100,11 +71,12 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
         minor = True)
 
     colors = {}
-    for class_ in classes:
+    for class_, placement in zip(classes, layout):
         # x-coordinates
         day = class_["day"] + 1
-        day_start = (day - 0.5) + class_["stacking"] / class_["total_stacking"]
-        day_end = day_start + 1 / class_["total_stacking"]
+        day_start = ((day - 0.5)
+            + placement.stacking / placement.total_stacking)
+        day_end = day_start + 1 / placement.total_stacking
         # y-coordinates
         start = _time_to_float(class_["start"])
         finish = _time_to_float(class_["finish"])
@@ -112,11 +84,11 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
         # class information
         class_name = "%s/%s" % (class_["class"]["class_type"],
             class_["class"]["class_repeat"])
-        too_narrow = len(class_name) * class_["total_stacking"] >= 19
+        too_narrow = len(class_name) * placement.total_stacking >= 19
             # 19 is the tested magic number
 
         # Draw the square
-        plt.fill_between(
+        subplot.fill_between(
             [day_start + X_MARGIN, day_end - X_MARGIN],
              start + Y_MARGIN,
              finish - Y_MARGIN,
@@ -124,12 +96,12 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
 
         if not too_narrow:
             # Draw starting time
-            plt.text(day_start + X_MARGIN * 2,
+            subplot.text(day_start + X_MARGIN * 2,
                 start + Y_MARGIN * 4,
                 "%d:%02d" % class_["start"],
                 fontsize = 8, va = "top")
             # Draw finishing time
-            plt.text(day_start + X_MARGIN * 2,
+            subplot.text(day_start + X_MARGIN * 2,
                 finish - Y_MARGIN * 4,
                 "%d:%02d" % class_["finish"],
                 fontsize = 8, va = "bottom")
@@ -140,7 +112,7 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
         else:
             rotation = 0
 
-        plt.text((day_start + day_end) / 2,
+        subplot.text((day_start + day_end) / 2,
             (start + finish) / 2,
             class_name,
             fontsize = 10,
@@ -157,12 +129,152 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
     # Get the bytes of the png
     import io
     image = io.BytesIO()
-    fig.savefig(image, format = format)
+    try:
+        fig.savefig(image, format = format)
+    finally:
+        if show_plot:
+            plt.close(fig)
+        else:
+            fig.clear()
     image.seek(0)
 
     return image.read()
 
 
+def _plot_svg(classes, layout, start, finish, number_of_days):
+    # The same plot as _plot_matplot, written directly as SVG text
+    from html import escape
+    from timetable import Weekday
+
+    # Size of the figure and position of the axes, as matplotlib lays out a
+    # 13x10 inch figure at 72 points per inch
+    WIDTH, HEIGHT = 13 * 72, 10 * 72
+    LEFT, RIGHT = 0.125 * WIDTH, 0.9 * WIDTH
+    TOP, BOTTOM = (1 - 0.88) * HEIGHT, (1 - 0.11) * HEIGHT
+    GRID = 'stroke="#b0b0b0" stroke-width="0.8"'
+    FONT = 'font-family="DejaVu Sans, Bitstream Vera Sans, sans-serif"'
+
+    first_hour = _time_to_int(start)
+    last_hour = _time_to_int(finish)
+    y_min = _time_to_float(start) - TIME_MARGIN
+    y_max = _time_to_float(finish) + TIME_MARGIN
+
+    def x(day):
+        return LEFT + (day - 0.5) / number_of_days * (RIGHT - LEFT)
+
+    def y(hours):
+        return TOP + (hours - y_min) / (y_max - y_min) * (BOTTOM - TOP)
+
+    def text(x_, y_, string, size, anchor = "start", baseline = "auto",
+    rotation = 0):
+        transform = ""
+        if rotation:
+            transform = ' transform="rotate(%d %.2f %.2f)"' % (
+                rotation, x_, y_)
+        return ('<text x="%.2f" y="%.2f" font-size="%d" %s '
+            'text-anchor="%s" dominant-baseline="%s"%s>%s</text>'
+            % (x_, y_, size, FONT, anchor, baseline, transform,
+                escape(string, quote = False)))
+
+    svg = ['<?xml version="1.0" encoding="utf-8" standalone="no"?>',
+        '<svg xmlns="http://www.w3.org/2000/svg" width="%dpt" height="%dpt" '
+        'viewBox="0 0 %d %d">' % (WIDTH, HEIGHT, WIDTH, HEIGHT),
+        '<rect width="100%" height="100%" fill="white"/>',
+        '<clipPath id="axes"><rect x="%.2f" y="%.2f" width="%.2f" '
+        'height="%.2f"/></clipPath>' % (LEFT, TOP, RIGHT - LEFT, BOTTOM - TOP)]
+
+    # The classes, with their squares drawn under the grids and their
+    # labels over them, as matplotlib stacks them
+    svg.append('<g clip-path="url(#axes)">')
+    labels = []
+    colors = {}
+    for class_, placement in zip(classes, layout):
+        # x-coordinates
+        day = class_["day"] + 1
+        day_start = ((day - 0.5)
+            + placement.stacking / placement.total_stacking)
+        day_end = day_start + 1 / placement.total_stacking
+        # y-coordinates
+        class_start = _time_to_float(class_["start"])
+        class_finish = _time_to_float(class_["finish"])
+
+        # class information
+        class_name = "%s/%s" % (class_["class"]["class_type"],
+            class_["class"]["class_repeat"])
+        too_narrow = len(class_name) * placement.total_stacking >= 19
+            # 19 is the tested magic number
+
+        # Draw the square
+        svg.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" '
+            'fill="%s"/>' % (x(day_start + X_MARGIN),
+                y(class_start + Y_MARGIN),
+                x(day_end - X_MARGIN) - x(day_start + X_MARGIN),
+                y(class_finish - Y_MARGIN) - y(class_start + Y_MARGIN),
+                _get_color(class_["class"]["subject"], colors)))
+
+        if not too_narrow:
+            # Draw starting and finishing time
+            labels.append(text(x(day_start + X_MARGIN * 2),
+                y(class_start + Y_MARGIN * 4),
+                "%d:%02d" % class_["start"], 8, baseline = "hanging"))
+            labels.append(text(x(day_start + X_MARGIN * 2),
+                y(class_finish - Y_MARGIN * 4),
+                "%d:%02d" % class_["finish"], 8,
+                baseline = "text-after-edge"))
+
+        # Draw class name
+        labels.append(text(x((day_start + day_end) / 2),
+            y((class_start + class_finish) / 2), class_name, 10,
+            anchor = "middle", baseline = "central",
+            rotation = 90 if too_narrow else 0))
+
+    # Grids: between days, on the hours and on the quarter hours
+    for day in range(1, number_of_days + 1):
+        svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" %s '
+            'stroke-opacity="0.85"/>' % (x(day + 0.5), TOP, x(day + 0.5),
+                BOTTOM, GRID))
+    for quarter in range(first_hour * 4, (last_hour + 1) * 4):
+        svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" %s '
+            'stroke-opacity="%s"/>' % (LEFT, y(quarter / 4), RIGHT,
+                y(quarter / 4), GRID, "0.85" if quarter % 4 == 0 else "0.3"))
+
+    svg += labels
+    svg.append('</g>')
+
+    # Frame, ticks and labels of the axes
+    svg.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" '
+        'fill="none" stroke="black" stroke-width="0.8"/>'
+        % (LEFT, TOP, RIGHT - LEFT, BOTTOM - TOP))
+    for day in range(1, number_of_days + 1):
+        svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" '
+            'stroke="black" stroke-width="0.6"/>'
+            % (x(day + 0.5), BOTTOM, x(day + 0.5), BOTTOM + 2))
+    for quarter in range(first_hour * 4, (last_hour + 1) * 4):
+        if y_min <= quarter / 4 <= y_max:
+            svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" '
+                'stroke="black" stroke-width="0.6"/>'
+                % (LEFT - 2, y(quarter / 4), LEFT, y(quarter / 4)))
+    for day, label in enumerate(Weekday.WEEKDAYS[:number_of_days], 1):
+        svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" '
+            'stroke="black" stroke-width="0.8"/>'
+            % (x(day), BOTTOM, x(day), BOTTOM + 3.5))
+        svg.append(text(x(day), BOTTOM + 7, label.title(), 10,
+            anchor = "middle", baseline = "hanging"))
+    for hour in range(first_hour, last_hour + 1):
+        svg.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" '
+            'stroke="black" stroke-width="0.8"/>'
+            % (LEFT - 3.5, y(hour), LEFT, y(hour)))
+        svg.append(text(LEFT - 7, y(hour), "%d:00" % hour, 10,
+            anchor = "end", baseline = "central"))
+    svg.append(text((LEFT + RIGHT) / 2, BOTTOM + 24, "Day", 10,
+        anchor = "middle", baseline = "hanging"))
+    svg.append(text(LEFT - 40, (TOP + BOTTOM) / 2, "Time", 10,
+        anchor = "middle", baseline = "central", rotation = -90))
+
+    svg.append('</svg>')
+    return "\n".join(svg).encode("utf-8")
+
+
 def _time_to_float(time):
     (hour, minutes) = time
     return hour + minutes / 60
@@ -174,28 +286,75 @@ def _time_to_int(time):
 def _get_color(subject, colors):
     COLORS = ["salmon", "wheat", "lightgreen", "pink", "lightblue"]
     if subject not in colors:
-        colors[subject] = COLORS[len(colors)]
+        colors[subject] = COLORS[len(colors) % len(COLORS)]
 
     return colors[subject]
 
 
-def fetch_timetables(subjects):
+def fetch_timetables(subjects, max_workers = DEFAULT_FETCH_WORKERS,
+timeout = None, retries = None, cache = None):
+    from concurrent.futures import ThreadPoolExecutor
+    import timetable
     from timetable import Timetable
-    subject_timetables = []
-    for year, semester, subject_code in subjects:
-        subject_timetables.append(
-            Timetable.get(year, semester, subject_code))
 
-    return subject_timetables
+    subjects = list(subjects)
+    if not subjects:
+        return []
+
+    if timeout is None:
+        timeout = timetable.DEFAULT_TIMEOUT
+    if retries is None:
+        retries = timetable.DEFAULT_RETRIES
+
+    # share one pool of keep-alive connections between the workers
+    workers = max(1, min(max_workers, len(subjects)))
+    session = Timetable.session(pool_size = workers, retries = retries)
+
+    def fetch(subject):
+        year, semester, subject_code = subject
+        return Timetable.get(year, semester, subject_code,
+            session = session, timeout = timeout, cache = cache)
+
+    try:
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            # map() keeps the results in the order of the input
+            return list(executor.map(fetch, subjects))
+    finally:
+        session.close()
 
 
 def draw_timetable(subject_timetables,
-format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
+format = DEFAULT_OUTPUT_FORMAT, show_plot = False,
+renderer = DEFAULT_RENDERER):
+    """Draw the classes of the subject timetables
+
+    The renderer is "svg" for the native SVG writer, "matplotlib", or "auto"
+    for the native writer for SVG and matplotlib for other formats or for
+    showing the plot.
+    """
+    import metrics
+    from layout import layout_classes
+
+    # determine format and renderer
+    if format not in SUPPORTED_OUTPUT_FORMATS:
+        format = DEFAULT_OUTPUT_FORMAT # fallback to defaults
+    if renderer not in SUPPORTED_RENDERERS:
+        raise Exception("Unknown renderer \"%s\"" % renderer)
+    if renderer == "auto":
+        if format == "svg" and not show_plot:
+            renderer = "svg"
+        else:
+            renderer = "matplotlib"
+    if renderer == "svg" and format != "svg":
+        raise Exception("The svg renderer cannot draw %s" % format)
+
     # Flatten clases from different subjects
     all_classes = _flatten_classes(subject_timetables)
 
     # calculate stacking width of clashing classes
-    all_classes = _stack_classes(all_classes)
+    with metrics.stage("layout"):
+        layout = layout_classes(all_classes)
+    metrics.count("classes_laid_out", len(all_classes))
 
     # calculate start and finish of timetable
     earliest_start = min([class_["start"] for class_ in all_classes])
@@ -208,11 +367,64 @@ format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
         number_of_days = 5
 
     # plot the timetable
-    return _plot_matplot(all_classes,
-        earliest_start, lattest_finish, number_of_days,
-        format, show_plot)
+    with metrics.stage("render.%s" % format):
+        if renderer == "svg":
+            return _plot_svg(all_classes, layout,
+                earliest_start, lattest_finish, number_of_days)
+
+        return _plot_matplot(all_classes, layout,
+            earliest_start, lattest_finish, number_of_days,
+            format, show_plot)
+
+
+def _init_render_worker():
+    # put matplotlib on a non-interactive backend, without importing it, so
+    # that workers drawing only native SVG never load it
+    import os
+    os.environ["MPLBACKEND"] = RENDER_BACKEND
+
+
+def _render_job(index, subject_timetables, format, renderer):
+    return (index, draw_timetable(subject_timetables, format,
+        renderer = renderer))
+
+
+def render_many(jobs, workers = None, format = DEFAULT_OUTPUT_FORMAT,
+renderer = DEFAULT_RENDERER):
+    """Draw many timetables in parallel, across a pool of processes
+
+    Each job is a list of subject timetables, as passed to draw_timetable.
+    Yields (index of the job, image bytes) as each drawing finishes, which
+    is not necessarily in the order of the jobs. At most twice as many jobs
+    as workers are in flight at a time.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, \
+        FIRST_COMPLETED
+    import os
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers = workers,
+            initializer = _init_render_worker) as executor:
+        pending = set()
+        for index, subject_timetables in enumerate(jobs):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            pending.add(executor.submit(_render_job,
+                index, subject_timetables, format, renderer))
+
+        while pending:
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
 
 
 def fetch_and_draw_timetable(subjects,
-format = DEFAULT_OUTPUT_FORMAT, show_plot = False):
-    return draw_timetable(fetch_timetables(subjects), format, show_plot)
+format = DEFAULT_OUTPUT_FORMAT, show_plot = False,
+renderer = DEFAULT_RENDERER):
+    return draw_timetable(fetch_timetables(subjects), format, show_plot,
+        renderer)
@@ -0,0 +1,273 @@
+"""
+Compact records for the classes of a timetable
+"""
+
+import sys
+from array import array
+
+from timetable import CLASS_ROW_HEADERS, CLASS_CODES, Weekday
+
+FIELDS = CLASS_CODES + ["description", "day", "start", "finish", "duration",
+    "weeks", "location", "date", "start_date"]
+STRING_FIELDS = [field for field in FIELDS
+    if field not in ("day", "start", "finish")]
+
+_WEEKDAY_NUMBERS = dict((day, num) for num, day in enumerate(Weekday.WEEKDAYS))
+
+
+def _intern(string):
+    return None if string is None else sys.intern(string)
+
+
+def minutes_from_string(time_string):
+    """Parse a time in the format HH:MM into minutes since midnight"""
+    try:
+        hour, minutes = map(int, time_string.split(":"))
+    except Exception:
+        raise Exception("Error while parsing time from string \"%s\""
+            % time_string)
+
+    if hour not in range(24) or minutes not in range(60):
+        raise Exception("Invalid hour/minutes supplied")
+
+    return hour * 60 + minutes
+
+
+def day_from_string(day_string):
+    """Parse a weekday into its number, starting from 0 for Monday"""
+    try:
+        return _WEEKDAY_NUMBERS[day_string.lower()]
+    except (KeyError, AttributeError):
+        raise Exception("Error while parsing weekday from string \"%s\""
+            % day_string)
+
+
+class ClassRecord:
+    """A class in a timetable
+
+    The strings are interned, the day is a number from 0 for Monday and the
+    times are in minutes since midnight. The record can also be read like
+    the dict of a parsed row, e.g. record["start"] is an (hour, minutes)
+    tuple and record["class"]["subject"] is the subject code.
+    """
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, subject, campus, num, semester, class_type,
+    class_repeat, description, day, start, finish, duration, weeks,
+    location, date, start_date):
+        self.subject = _intern(subject)
+        self.campus = _intern(campus)
+        self.num = _intern(num)
+        self.semester = _intern(semester)
+        self.class_type = _intern(class_type)
+        self.class_repeat = _intern(class_repeat)
+        self.description = _intern(description)
+        self.day = day
+        self.start = start
+        self.finish = finish
+        self.duration = _intern(duration)
+        self.weeks = _intern(weeks)
+        self.location = _intern(location)
+        self.date = _intern(date)
+        self.start_date = _intern(start_date)
+
+
+    @staticmethod
+    def from_row(row):
+        """Create a record from the cells of a row of a report"""
+        cells = dict(zip(CLASS_ROW_HEADERS, row))
+        codes = cells["class"].split("/")
+        if len(codes) != len(CLASS_CODES):
+            raise Exception("Error while parsing class code from string "
+                "\"%s\"" % cells["class"])
+
+        return ClassRecord(*codes,
+            description = cells["description"],
+            day = day_from_string(cells["day"]),
+            start = minutes_from_string(cells["start"]),
+            finish = minutes_from_string(cells["finish"]),
+            duration = cells["duration"],
+            weeks = cells["weeks"],
+            location = cells["location"],
+            date = cells["date"],
+            start_date = cells["start_date"])
+
+
+    @staticmethod
+    def from_dict(class_):
+        """Create a record from the dict of a parsed row"""
+        (start_hour, start_minutes) = class_["start"]
+        (finish_hour, finish_minutes) = class_["finish"]
+        codes = class_["class"]
+
+        return ClassRecord(*[codes[code] for code in CLASS_CODES],
+            description = class_["description"],
+            day = class_["day"],
+            start = start_hour * 60 + start_minutes,
+            finish = finish_hour * 60 + finish_minutes,
+            duration = class_["duration"],
+            weeks = class_["weeks"],
+            location = class_["location"],
+            date = class_["date"],
+            start_date = class_["start_date"])
+
+
+    @property
+    def code(self):
+        """The class code, e.g. COMP20003/U/1/SM2/W01/08"""
+        return "/".join(getattr(self, code) for code in CLASS_CODES)
+
+
+    def to_dict(self):
+        return dict((key, self[key]) for key in CLASS_ROW_HEADERS)
+
+
+    def keys(self):
+        return list(CLASS_ROW_HEADERS)
+
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def __getitem__(self, key):
+        if key == "class":
+            return dict((code, getattr(self, code)) for code in CLASS_CODES)
+        if key == "start" or key == "finish":
+            return divmod(getattr(self, key), 60)
+        if key in CLASS_ROW_HEADERS:
+            return getattr(self, key)
+
+        raise KeyError(key)
+
+
+    def __iter__(self):
+        return iter(CLASS_ROW_HEADERS)
+
+
+    def __len__(self):
+        return len(CLASS_ROW_HEADERS)
+
+
+    def __eq__(self, other):
+        if isinstance(other, ClassRecord):
+            return self.__values() == other.__values()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+
+        return NotImplemented
+
+
+    def __hash__(self):
+        return hash(self.__values())
+
+
+    def __reduce__(self):
+        # pickle as the plain values, re-interning them when loaded
+        return (ClassRecord, self.__values())
+
+
+    def __repr__(self):
+        return "ClassRecord(%s, %s, %d:%02d-%d:%02d)" % ((self.code,
+            Weekday.WEEKDAYS[self.day].title()) + divmod(self.start, 60)
+            + divmod(self.finish, 60))
+
+
+    def __values(self):
+        return tuple(getattr(self, field) for field in FIELDS)
+
+
+class ClassTable:
+    """A columnar container of classes, for holding large sets of them
+
+    The days and times are kept in arrays, which can be wrapped without
+    copying by e.g. numpy.frombuffer, and each string column keeps indexes
+    into a table of the distinct strings.
+    """
+
+    def __init__(self, records = ()):
+        self.days = array("B")
+        self.starts = array("H")
+        self.finishes = array("H")
+
+        self.__strings = [] # distinct strings, indexed by the string columns
+        self.__string_indexes = {}
+        self.__columns = dict((field, array("I")) for field in STRING_FIELDS)
+
+        self.extend(records)
+
+
+    def append(self, record):
+        if isinstance(record, dict):
+            record = ClassRecord.from_dict(record)
+
+        self.days.append(record.day)
+        self.starts.append(record.start)
+        self.finishes.append(record.finish)
+        for field in STRING_FIELDS:
+            self.__columns[field].append(self.__index(getattr(record, field)))
+
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+
+    def column(self, field):
+        """Return the values of a field for all the classes, in order"""
+        if field == "day":
+            return self.days
+        if field == "start":
+            return self.starts
+        if field == "finish":
+            return self.finishes
+
+        strings = self.__strings
+        return [strings[index] for index in self.__columns[field]]
+
+
+    def __index(self, string):
+        index = self.__string_indexes.get(string)
+        if index is None:
+            index = len(self.__strings)
+            self.__strings.append(_intern(string))
+            self.__string_indexes[string] = index
+
+        return index
+
+
+    def __len__(self):
+        return len(self.days)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        strings = dict((field, self.__strings[self.__columns[field][index]])
+            for field in STRING_FIELDS)
+        return ClassRecord(day = self.days[index], start = self.starts[index],
+            finish = self.finishes[index], **strings)
+
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def timetables_to_json(subject_timetables):
+    """The subject timetables as JSON-serialisable dicts"""
+    return [{"year": year, "semester": semester, "subject": subject,
+        "classes": [dict(class_) for class_ in classes]}
+        for (year, semester, subject), classes in subject_timetables]
+
+
+def timetables_from_json(data):
+    """The subject timetables of dicts written by timetables_to_json"""
+    return [((timetable["year"], timetable["semester"], timetable["subject"]),
+        [ClassRecord.from_dict(class_) for class_ in timetable["classes"]])
+        for timetable in data]
@@ -0,0 +1,175 @@
+"""
+Incremental refresh of timetables: snapshots of the fetched class lists, a
+differ between snapshots, and a reverse index from subjects to the rendered
+outputs that depend on them, so that only the outputs of changed subjects
+are rendered again
+"""
+
+import collections
+import pickle
+import sqlite3
+import threading
+
+from timetable import CLASS_CODES
+
+ClassDiff = collections.namedtuple("ClassDiff",
+    ["added", "removed", "changed"])
+SubjectChange = collections.namedtuple("SubjectChange", ["subject", "diff"])
+
+
+def class_key(class_):
+    """The identity of a class across snapshots: its code, day and start"""
+    codes = class_["class"]
+    return ("/".join(codes[code] for code in CLASS_CODES), class_["day"],
+        tuple(class_["start"]))
+
+
+def diff_classes(old, new):
+    """Compare two class lists of a subject
+
+    Returns a ClassDiff of the added and removed classes, and of the
+    (old, new) pairs of classes with the same key but other details, like
+    the location or the weeks, changed.
+    """
+    old_classes = collections.OrderedDict(
+        (class_key(class_), class_) for class_ in old)
+    new_classes = collections.OrderedDict(
+        (class_key(class_), class_) for class_ in new)
+
+    added = [class_ for key, class_ in new_classes.items()
+        if key not in old_classes]
+    removed = [class_ for key, class_ in old_classes.items()
+        if key not in new_classes]
+    changed = [(old_classes[key], class_) for key, class_
+        in new_classes.items()
+        if key in old_classes and dict(old_classes[key]) != dict(class_)]
+
+    return ClassDiff(added, removed, changed)
+
+
+class SnapshotStore:
+    """The last fetched class list of each (year, semester, subject)
+
+    Snapshots are kept in memory, and in a SQLite file if a path is given.
+    """
+
+    def __init__(self, path = None):
+        self.__snapshots = {}
+        self.__lock = threading.Lock()
+        self.__db = None
+        if path is not None:
+            self.__db = sqlite3.connect(path, check_same_thread = False)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS snapshots ("
+                "year INTEGER, semester TEXT, subject TEXT, data BLOB, "
+                "PRIMARY KEY (year, semester, subject))")
+            self.__db.commit()
+            for year, semester, subject, data in self.__db.execute(
+                    "SELECT year, semester, subject, data FROM snapshots"):
+                self.__snapshots[(year, semester, subject)] = \
+                    pickle.loads(data)
+
+
+    def get(self, subject):
+        return self.__snapshots.get(_normalize(subject))
+
+
+    def put(self, subject, classes):
+        subject = _normalize(subject)
+        with self.__lock:
+            self.__snapshots[subject] = classes
+            if self.__db is not None:
+                self.__db.execute("INSERT OR REPLACE INTO snapshots VALUES "
+                    "(?, ?, ?, ?)", subject
+                    + (pickle.dumps(classes, pickle.HIGHEST_PROTOCOL),))
+                self.__db.commit()
+
+
+    def subjects(self):
+        return list(self.__snapshots)
+
+
+    def close(self):
+        with self.__lock:
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+
+class RenderIndex:
+    """A reverse index from subjects to the outputs rendered from them"""
+
+    def __init__(self):
+        self.__subjects = {} # output -> subjects it is rendered from
+        self.__outputs = collections.defaultdict(set) # subject -> outputs
+
+
+    def register(self, output, subjects):
+        """Record that the output, e.g. a student's timetable, is rendered
+        from the (year, semester, subject) keys"""
+        self.unregister(output)
+        subjects = [_normalize(subject) for subject in subjects]
+        self.__subjects[output] = subjects
+        for subject in subjects:
+            self.__outputs[subject].add(output)
+
+
+    def unregister(self, output):
+        for subject in self.__subjects.pop(output, []):
+            self.__outputs[subject].discard(output)
+            if not self.__outputs[subject]:
+                del self.__outputs[subject]
+
+
+    def subjects(self, output):
+        return list(self.__subjects[output])
+
+
+    def outputs(self, subjects):
+        """Return the outputs which depend on any of the subjects"""
+        outputs = set()
+        for subject in subjects:
+            outputs |= self.__outputs.get(_normalize(subject), set())
+
+        return outputs
+
+
+def _normalize(subject):
+    # as stored in the snapshots table, whose year column is an INTEGER
+    year, semester, code = subject
+    return (int(year), semester.upper(), code.upper())
+
+
+class Refresher:
+    """Apply newly fetched timetables to the snapshots, re-rendering only the
+    outputs whose subjects have changed"""
+
+    def __init__(self, store = None, index = None):
+        self.store = store if store is not None else SnapshotStore()
+        self.index = index if index is not None else RenderIndex()
+
+
+    def refresh(self, subject_timetables, render = None):
+        """Store the timetables, as returned by plot.fetch_timetables
+
+        Returns the change feed: a SubjectChange with the ClassDiff of each
+        subject whose classes changed (a subject seen for the first time has
+        all its classes added). If render is given, it is called as
+        render(output, subject_timetables) for each output depending on a
+        changed subject, with the snapshots of the output's subjects.
+        """
+        changes = []
+        for subject, classes in subject_timetables:
+            subject = _normalize(subject)
+            old = self.store.get(subject)
+            diff = diff_classes(old or [], classes)
+            if old is None or any(diff):
+                changes.append(SubjectChange(subject, diff))
+                self.store.put(subject, classes)
+
+        if render is not None:
+            for output in self.index.outputs(
+                    change.subject for change in changes):
+                render(output, [(subject, self.store.get(subject) or [])
+                    for subject in self.index.subjects(output)])
+
+        return changes
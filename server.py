@@ -0,0 +1,414 @@
+"""
+An asyncio HTTP server of timetables, solutions and drawings
+
+    GET /timetables?subjects=2016:SM2:COMP20003,2016:SM2:MAST20026
+    GET /solve?subjects=...&objective=gaps&limit=3&allow_clashes=L
+    GET /timetable.svg?subjects=...
+    GET /timetable.png?subjects=...
+
+Concurrent requests for a subject share one upstream fetch, drawings are
+cached by a hash of their sorted subjects and format, and fetching, drawing
+and solving run in executors so the event loop is never blocked.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import time
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_RENDER_CACHE_ENTRIES = 1024
+DEFAULT_RENDER_TTL = 5 * 60 # seconds, before a drawing is drawn again
+MAX_SUBJECTS = 16 # per request
+MAX_SOLUTIONS = 10 # per request
+DEFAULT_SOLVE_WORKERS = 2
+DEFAULT_SOLVE_TIMEOUT = 10 # seconds, of solving for a request
+MAX_HEADERS = 100
+
+IMAGE_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+    502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call"""
+
+    def __init__(self):
+        self.__calls = {} # key -> future of the call in flight
+
+
+    async def do(self, key, function):
+        """Await function(), or the call in flight with the same key"""
+        future = self.__calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(function())
+            self.__calls[key] = future
+            future.add_done_callback(lambda _: self.__calls.pop(key, None))
+
+        # a waiter which is cancelled must not cancel the other waiters
+        return await asyncio.shield(future)
+
+
+class RenderCache:
+    """An LRU cache of drawings, each kept for at most the TTL"""
+
+    def __init__(self, entries = DEFAULT_RENDER_CACHE_ENTRIES,
+    ttl = DEFAULT_RENDER_TTL):
+        self.entries = entries
+        self.ttl = ttl
+        self.__images = collections.OrderedDict() # key -> (image, drawn at)
+
+
+    @staticmethod
+    def key(subjects, format):
+        """The hash of the sorted subjects and the format"""
+        subjects = sorted("%s:%s:%s" % subject for subject in subjects)
+        return hashlib.sha256(("\n".join(subjects) + "\n" + format)
+            .encode("utf-8")).hexdigest()
+
+
+    def get(self, key):
+        image = self.__images.get(key)
+        if image is None:
+            return None
+        if time.time() - image[1] >= self.ttl:
+            del self.__images[key]
+            return None
+
+        self.__images.move_to_end(key)
+        return image[0]
+
+
+    def put(self, key, image):
+        self.__images[key] = (image, time.time())
+        self.__images.move_to_end(key)
+        while len(self.__images) > self.entries:
+            self.__images.popitem(last = False)
+
+
+def parse_subjects(values):
+    """Parse subjects given as YEAR:SEMESTER:CODE, separated by commas"""
+    subjects = []
+    for value in values:
+        for subject in value.split(","):
+            if not subject.strip():
+                continue
+            try:
+                year, semester, code = subject.strip().split(":")
+                subjects.append((int(year), semester.upper(), code.upper()))
+            except ValueError:
+                raise HTTPError(400, "subject \"%s\" is not in the form "
+                    "YEAR:SEMESTER:CODE" % subject)
+
+    if not subjects:
+        raise HTTPError(400, "no subjects given")
+    if len(subjects) > MAX_SUBJECTS:
+        raise HTTPError(400, "at most %d subjects are allowed"
+            % MAX_SUBJECTS)
+
+    # drop repeated subjects, keeping the order of the others
+    return list(collections.OrderedDict.fromkeys(subjects))
+
+
+def _solve_job(subject_timetables, objective, limit, allow_clashes,
+timeout):
+    # return the solutions, or None if solving takes over the timeout, which
+    # is enforced in the worker so an expensive solve cannot hold it
+    import itertools
+    import signal
+    from solver import solve
+
+    def expire(signum, frame):
+        raise TimeoutError()
+
+    timed = hasattr(signal, "setitimer")
+    if timed:
+        previous = signal.signal(signal.SIGALRM, expire)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return list(itertools.islice(solve(subject_timetables, objective,
+            allow_clashes = allow_clashes), limit))
+    except TimeoutError:
+        return None
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class TimetableServer:
+    """Serve timetables fetched through an optional TimetableCache
+
+    Fetches run on a pool of threads sharing one keep-alive session, and
+    drawing and solving on pools of processes of their own, so that long
+    solves cannot hold up drawings.
+    """
+
+    def __init__(self, cache = None, fetch_workers = DEFAULT_FETCH_WORKERS,
+    render_workers = None, render_cache = None,
+    solve_workers = DEFAULT_SOLVE_WORKERS,
+    solve_timeout = DEFAULT_SOLVE_TIMEOUT):
+        self.cache = cache
+        self.fetch_workers = fetch_workers
+        self.render_workers = render_workers
+        self.solve_workers = solve_workers
+        self.solve_timeout = solve_timeout
+        self.render_cache = render_cache if render_cache is not None \
+            else RenderCache()
+
+        self.__fetches = SingleFlight()
+        self.__renders = SingleFlight()
+        self.__session = None
+        self.__fetch_executor = None
+        self.__render_executor = None
+        self.__solve_executor = None
+        self.__server = None
+        self.__connections = set() # the tasks handling open connections
+
+
+    async def start(self, host = DEFAULT_HOST, port = DEFAULT_PORT):
+        """Start listening, and return the asyncio server"""
+        from concurrent.futures import ProcessPoolExecutor, \
+            ThreadPoolExecutor
+        import multiprocessing
+        import plot
+        from timetable import Timetable
+
+        # the workers are started on the first job, so forking them from
+        # this process would leak the sockets open at the time (keeping
+        # closed connections open) into them
+        context = multiprocessing.get_context("forkserver"
+            if "forkserver" in multiprocessing.get_all_start_methods()
+            else "spawn")
+
+        self.__session = Timetable.session(pool_size = self.fetch_workers)
+        self.__fetch_executor = ThreadPoolExecutor(
+            max_workers = self.fetch_workers)
+        self.__render_executor = ProcessPoolExecutor(
+            max_workers = self.render_workers, mp_context = context,
+            initializer = plot._init_render_worker)
+        self.__solve_executor = ProcessPoolExecutor(
+            max_workers = self.solve_workers, mp_context = context)
+
+        self.__server = await asyncio.start_server(self.__handle,
+            host, port)
+        return self.__server
+
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            for connection in list(self.__connections):
+                connection.cancel()
+            await asyncio.gather(*self.__connections,
+                return_exceptions = True)
+            await self.__server.wait_closed()
+            self.__server = None
+        # without waiting for the work in flight, which would block the loop
+        for executor in [self.__fetch_executor, self.__render_executor,
+                self.__solve_executor]:
+            if executor is not None:
+                executor.shutdown(wait = False, cancel_futures = True)
+        if self.__session is not None:
+            self.__session.close()
+
+
+    async def timetables(self, subjects):
+        """Return the subject timetables of the subjects, in their order"""
+        return await asyncio.gather(*[self.__fetches.do(subject,
+            lambda subject = subject: self.__fetch(subject))
+            for subject in subjects])
+
+
+    async def render(self, subjects, format):
+        """Return the drawing of the subjects in the format, from the render
+        cache while it is there"""
+        import functools
+        import plot
+
+        key = RenderCache.key(subjects, format)
+        image = self.render_cache.get(key)
+        if image is not None:
+            return image
+
+        async def render():
+            # the colours of the subjects follow their order, so draw them in
+            # the order of the key
+            subject_timetables = await self.timetables(sorted(subjects))
+            if not any(classes for _, classes in subject_timetables):
+                raise HTTPError(404, "the subjects have no classes")
+            image = await asyncio.get_running_loop().run_in_executor(
+                self.__render_executor, functools.partial(
+                    plot.draw_timetable, subject_timetables, format))
+            self.render_cache.put(key, image)
+            return image
+
+        return await self.__renders.do(key, render)
+
+
+    async def solve(self, subjects, objective, limit, allow_clashes = ()):
+        """Return the best solutions, as a list of solver.Solution"""
+        subject_timetables = await self.timetables(subjects)
+        solutions = await asyncio.get_running_loop().run_in_executor(
+            self.__solve_executor, _solve_job, subject_timetables,
+            objective, limit, list(allow_clashes), self.solve_timeout)
+        if solutions is None:
+            raise HTTPError(503, "solving took over %s seconds"
+                % self.solve_timeout)
+
+        return solutions
+
+
+    async def __fetch(self, subject):
+        from timetable import Timetable
+
+        year, semester, code = subject
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.__fetch_executor, lambda: Timetable.get(year, semester,
+                    code, session = self.__session, cache = self.cache))
+        except Exception as error:
+            raise HTTPError(502, "could not fetch %s:%s:%s (%s)"
+                % (subject + (error,)))
+
+
+    async def __respond(self, path, query, headers):
+        """Return the status, content type, body and extra headers of a
+        request"""
+        import solver
+        from records import timetables_to_json
+
+        if path == "/timetables":
+            subject_timetables = await self.timetables(
+                parse_subjects(query.get("subjects", [])))
+            return (200, "application/json",
+                _json(timetables_to_json(subject_timetables)), {})
+
+        if path == "/solve":
+            subjects = parse_subjects(query.get("subjects", []))
+            objective = query.get("objective",
+                [solver.DEFAULT_OBJECTIVE])[-1]
+            if objective not in solver.OBJECTIVES:
+                raise HTTPError(400, "unknown objective \"%s\"" % objective)
+            try:
+                limit = int(query.get("limit", ["1"])[-1])
+            except ValueError:
+                raise HTTPError(400, "limit is not a number")
+            if limit < 1:
+                raise HTTPError(400, "limit must be at least 1")
+            limit = min(limit, MAX_SOLUTIONS)
+            allow_clashes = [class_type for value
+                in query.get("allow_clashes", [])
+                for class_type in value.split(",") if class_type]
+
+            solutions = await self.solve(subjects, objective, limit,
+                allow_clashes)
+            return (200, "application/json", _json([{"cost": solution.cost,
+                "timetables": timetables_to_json(solution.timetables)}
+                for solution in solutions]), {})
+
+        for format, content_type in IMAGE_TYPES.items():
+            if path == "/timetable.%s" % format:
+                # the tag is of the content, so it changes with the classes
+                # once the cached drawing expires and is drawn again
+                image = await self.render(
+                    parse_subjects(query.get("subjects", [])), format)
+                etag = '"%s"' % hashlib.sha256(image).hexdigest()
+                if headers.get("if-none-match") == etag:
+                    return (304, content_type, b"", {"ETag": etag})
+                return (200, content_type, image, {"ETag": etag})
+
+        raise HTTPError(404, "no such path \"%s\"" % path)
+
+
+    async def __handle(self, reader, writer):
+        import urllib.parse
+
+        connection = asyncio.current_task()
+        self.__connections.add(connection)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while len(headers) <= MAX_HEADERS:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = \
+                        request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                keep_alive = (version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close")
+
+                url = urllib.parse.urlsplit(target)
+                try:
+                    if method not in ("GET", "HEAD"):
+                        raise HTTPError(405, "only GET and HEAD are allowed")
+                    response = await self.__respond(url.path,
+                        urllib.parse.parse_qs(url.query), headers)
+                except HTTPError as error:
+                    response = (error.status, "application/json",
+                        _json({"error": str(error)}), {})
+                except Exception as error:
+                    response = (500, "application/json",
+                        _json({"error": repr(error)}), {})
+
+                status, content_type, body, extra_headers = response
+                head = ["HTTP/1.1 %d %s" % (status, REASONS[status]),
+                    "Content-Type: %s" % content_type,
+                    "Content-Length: %d" % len(body),
+                    "Connection: %s" % ("keep-alive" if keep_alive
+                        else "close")]
+                head += ["%s: %s" % header for header in extra_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass # by close(), which ends the connection
+        finally:
+            self.__connections.discard(connection)
+            writer.close()
+
+
+def _json(data):
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def serve(host = DEFAULT_HOST, port = DEFAULT_PORT, cache = None,
+fetch_workers = DEFAULT_FETCH_WORKERS, render_workers = None):
+    """Run a TimetableServer until interrupted"""
+
+    async def run():
+        server = TimetableServer(cache, fetch_workers, render_workers)
+        try:
+            await (await server.start(host, port)).serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
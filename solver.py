@@ -0,0 +1,245 @@
+"""
+A solver for clash-free timetables, which chooses one repeat of each class
+stream of the selected subjects
+"""
+
+import collections
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+NUMBER_OF_DAYS = 7
+DEFAULT_OBJECTIVE = "days"
+
+Solution = collections.namedtuple("Solution", ["cost", "timetables"])
+
+
+def _minutes(time):
+    (hour, minutes) = time
+    return hour * 60 + minutes
+
+
+def _class_mask(class_):
+    # one bit per time slot of the week, covering the class
+    first = _minutes(class_["start"]) // SLOT_MINUTES
+    last = -(-_minutes(class_["finish"]) // SLOT_MINUTES)
+    offset = class_["day"] * SLOTS_PER_DAY
+    return ((1 << (last - first)) - 1) << (offset + first)
+
+
+def _day_masks(mask):
+    for day in range(NUMBER_OF_DAYS):
+        day_mask = (mask >> (day * SLOTS_PER_DAY)) & DAY_MASK
+        if day_mask:
+            yield day, day_mask
+
+
+def _gap_mask(day_mask):
+    # the free slots between the first and the last class of a day
+    lowest = day_mask & -day_mask
+    highest = 1 << (day_mask.bit_length() - 1)
+    return ((highest << 1) - lowest) & ~day_mask
+
+
+def days_cost(mask, coverable = 0):
+    """The number of days on campus"""
+    return sum(1 for _ in _day_masks(mask))
+
+
+def latest_start_cost(mask, coverable = 0):
+    """The earliest start of the week, negated so later starts cost less"""
+    starts = [(day_mask & -day_mask).bit_length() - 1
+        for _, day_mask in _day_masks(mask)]
+    return -min(starts, default = SLOTS_PER_DAY) * SLOT_MINUTES
+
+
+def gaps_cost(mask, coverable = 0):
+    """The minutes of gaps between classes
+
+    Gaps that the classes still to be chosen could fill (the slots in
+    coverable) are not counted, so this is a lower bound for a partial
+    timetable.
+    """
+    gaps = 0
+    for day, day_mask in _day_masks(mask):
+        day_coverable = (coverable >> (day * SLOTS_PER_DAY)) & DAY_MASK
+        gaps += bin(_gap_mask(day_mask) & ~day_coverable).count("1")
+
+    return gaps * SLOT_MINUTES
+
+
+# Each objective is a lower bound of the cost of any timetable completed
+# from a partial one, which is exact once the timetable is complete
+OBJECTIVES = {
+    "days": days_cost,
+    "latest_start": latest_start_cost,
+    "gaps": gaps_cost
+}
+
+
+def _streams(subject_timetables, allow_clashes):
+    # group the repeats of each (subject, class type) into options, each
+    # with its bit among all the options, the bits of the options it clashes
+    # with, the mask of its time slots and the classes in it
+    streams = collections.OrderedDict()
+    for index, (_, classes) in enumerate(subject_timetables):
+        for class_ in classes:
+            codes = class_["class"]
+            repeats = streams.setdefault((index, codes["class_type"]),
+                collections.OrderedDict())
+            repeats.setdefault(codes["class_repeat"], []).append(class_)
+
+    options = []
+    for (_, class_type), repeats in streams.items():
+        may_clash = class_type.rstrip("0123456789") in allow_clashes
+        stream_options = []
+        for classes in repeats.values():
+            mask = 0
+            for class_ in classes:
+                mask |= _class_mask(class_)
+            stream_options.append((0 if may_clash else mask, mask, classes))
+        options.append(stream_options)
+
+    # options clash if any of their classes are at the same time in a
+    # common week, which the slot masks rule out for most pairs at once
+    flat = [(stream, option) for stream, stream_options in enumerate(options)
+        for option in range(len(stream_options))]
+    conflicts = [0] * len(flat)
+    for a, (stream_a, option_a) in enumerate(flat):
+        clash_mask_a, _, classes_a = options[stream_a][option_a]
+        for b in range(a + 1, len(flat)):
+            stream_b, option_b = flat[b]
+            clash_mask_b, _, classes_b = options[stream_b][option_b]
+            if (stream_a != stream_b and clash_mask_a & clash_mask_b
+                    and any(_classes_clash(class_a, class_b)
+                        for class_a in classes_a for class_b in classes_b)):
+                conflicts[a] |= 1 << b
+                conflicts[b] |= 1 << a
+
+    for bit, (stream, option) in enumerate(flat):
+        _, mask, classes = options[stream][option]
+        options[stream][option] = (1 << bit, conflicts[bit], mask, classes)
+
+    return options
+
+
+def _classes_clash(class_a, class_b):
+    # classes whose weeks cannot be parsed clash if they share a time slot,
+    # rather than failing the solve
+    from weeks import classes_clash
+
+    try:
+        return classes_clash(class_a, class_b)
+    except Exception:
+        return bool(_class_mask(class_a) & _class_mask(class_b))
+
+
+def solve(subject_timetables, objective = DEFAULT_OBJECTIVE, limit = None,
+allow_clashes = ()):
+    """Generate clash-free timetables, the best first
+
+    Takes the output of plot.fetch_timetables, and chooses exactly one
+    repeat for each class type of each subject, so that no classes clash
+    (are at the same time in a common week).
+    The objective is one of OBJECTIVES, or a function of the slot mask of
+    a partial timetable (and the mask of the slots still coverable) which
+    never decreases as the timetable is completed. Classes of the class
+    types in allow_clashes (codes of subject_codes.CLASS_TYPES, e.g. "L" for
+    recorded lectures) may clash with other classes.
+
+    The search is a depth-first backtracking, always extending the stream
+    with the fewest repeats left that fit (checked against bitsets of the
+    clashing repeats). It only extends partial timetables whose cost bound
+    is within a threshold, which starts at the bound of the empty timetable
+    and is raised to the lowest bound over it after each pass, so the
+    solutions come out lazily in order of cost, with memory in proportion
+    to the number of streams. Each is a Solution, whose timetables can be
+    passed to plot.draw_timetable.
+    """
+    cost = OBJECTIVES.get(objective, objective)
+    if not callable(cost):
+        raise Exception("Unknown objective \"%s\"" % objective)
+
+    options = _streams(subject_timetables, allow_clashes)
+    if not options:
+        if limit is None or limit > 0:
+            yield Solution(cost(0, 0),
+                _chosen_timetables(subject_timetables, options, {}))
+        return
+
+    coverable = 0
+    for stream_options in options:
+        for _, _, mask, _ in stream_options:
+            coverable |= mask
+    threshold = cost(0, coverable)
+
+    solutions = 0
+    while limit is None or solutions < limit:
+        pruned = [] # the bounds over the threshold
+        for bound, choices in _search(options, cost, threshold, pruned,
+                0, 0, {}):
+            if bound < threshold:
+                continue # yielded by an earlier pass
+            if limit is not None and solutions >= limit:
+                return
+            solutions += 1
+            yield Solution(bound,
+                _chosen_timetables(subject_timetables, options, choices))
+
+        if not pruned:
+            return # no solutions are left
+        threshold = min(pruned)
+
+
+def _search(options, cost, threshold, pruned, chosen, mask, choices):
+    # yield the (cost, choices) of the solutions extending a partial
+    # timetable within the threshold, where choices maps the index of a
+    # stream to the index of its chosen option
+
+    # forward checking: the options of each stream that still fit
+    domains = {}
+    for stream, stream_options in enumerate(options):
+        if stream not in choices:
+            domains[stream] = [option for option, (_, conflicts, _, _)
+                in enumerate(stream_options)
+                if not conflicts & chosen]
+    if not all(domains.values()):
+        return # some stream can no longer be fitted
+
+    stream = min(domains, key = lambda stream: len(domains[stream]))
+
+    # the slots the other streams could still fill
+    coverable = 0
+    for other, other_options in domains.items():
+        if other != stream:
+            for other_option in other_options:
+                coverable |= options[other][other_option][2]
+
+    children = []
+    for option in domains[stream]:
+        option_mask = options[stream][option][2]
+        children.append((cost(mask | option_mask, coverable), option))
+    children.sort() # the most promising first
+
+    for bound, option in children:
+        if bound > threshold:
+            pruned.append(bound)
+            break # and so are the children after it
+
+        option_bit, _, option_mask, _ = options[stream][option]
+        child_choices = dict(choices)
+        child_choices[stream] = option
+        if len(child_choices) == len(options):
+            yield bound, child_choices
+        else:
+            yield from _search(options, cost, threshold, pruned,
+                chosen | option_bit, mask | option_mask, child_choices)
+
+
+def _chosen_timetables(subject_timetables, options, choices):
+    chosen = set()
+    for stream, option in choices.items():
+        chosen.update(id(class_) for class_ in options[stream][option][3])
+
+    return [(key, [class_ for class_ in classes if id(class_) in chosen])
+        for key, classes in subject_timetables]
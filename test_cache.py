@@ -0,0 +1,136 @@
+"""
+Tests of the timetable cache, on its own and through Timetable.get against a
+local stand-in of the SWS reports
+"""
+
+import pickle
+import time
+
+import pytest
+import requests
+
+import test_data
+from benchmarks import sws
+from cache import TimetableCache
+from timetable import Timetable
+
+SUBJECT = (2016, "SM2", "COMP20003")
+CLASSES = test_data.two_subjects[0][1]
+OTHER_CLASSES = test_data.two_subjects[1][1]
+LAST_MODIFIED = "Mon, 01 Aug 2016 00:00:00 GMT"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The time, in seconds, as seen by the cache"""
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def _get(cache):
+    return Timetable.get(*SUBJECT, cache = cache)[1]
+
+
+def test_fresh_entries_are_not_requested(clock):
+    cache = TimetableCache(ttl = 60)
+    with sws.StubServer() as stub:
+        assert _get(cache) == CLASSES
+        clock[0] += 59
+        assert _get(cache) == CLASSES
+
+    assert stub.requests == 1
+
+
+@pytest.mark.parametrize("validators", [{"etag": '"stub"'},
+    {"etag": None, "last_modified": LAST_MODIFIED}])
+def test_stale_entries_are_revalidated(clock, validators):
+    cache = TimetableCache(ttl = 60)
+    with sws.StubServer(**validators) as stub:
+        assert _get(cache) == CLASSES
+
+        # unchanged as far as the validators tell, so the 304 reuses the
+        # cached classes
+        stub.subjects = {"COMP20003": OTHER_CLASSES}
+        clock[0] += 60
+        assert _get(cache) == CLASSES
+        assert stub.requests == 2
+
+        # and they are fresh again
+        clock[0] += 59
+        assert _get(cache) == CLASSES
+        assert stub.requests == 2
+
+
+def test_changed_entries_are_replaced(clock):
+    cache = TimetableCache(ttl = 60)
+    with sws.StubServer() as stub:
+        assert _get(cache) == CLASSES
+
+        stub.subjects = {"COMP20003": OTHER_CLASSES}
+        stub.etag = '"changed"'
+        clock[0] += 60
+        assert _get(cache) == OTHER_CLASSES
+        assert _get(cache) == OTHER_CLASSES
+
+    assert stub.requests == 2
+
+
+def test_error_responses_are_not_cached():
+    cache = TimetableCache()
+    with sws.StubServer(failures = 1) as stub:
+        with pytest.raises(requests.HTTPError):
+            _get(cache)
+        assert list(cache.entries()) == []
+
+        assert _get(cache) == CLASSES
+
+    assert stub.requests == 2
+
+
+def test_got_classes_are_copies():
+    cache = TimetableCache()
+    with sws.StubServer():
+        _get(cache).clear()
+        assert _get(cache) == CLASSES
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    memory = TimetableCache(memory_entries = 2)
+    disk = TimetableCache(str(tmp_path / "cache.db"), memory_entries = 2)
+    for cache in [memory, disk]:
+        for key in "abc":
+            cache.put(key, CLASSES)
+        assert len(list(cache.entries())) == (2 if cache is memory else 3)
+        assert cache.get("b").classes == CLASSES
+
+    assert memory.get("a") is None
+    # the disk tier still has it
+    assert disk.get("a").classes == CLASSES
+
+
+def test_disk_tier_evicts_least_recently_used(clock, tmp_path):
+    size = len(pickle.dumps(CLASSES, pickle.HIGHEST_PROTOCOL))
+    cache = TimetableCache(str(tmp_path / "cache.db"),
+        max_bytes = size * 5 // 2, memory_entries = 1)
+    for key in "ab":
+        cache.put(key, CLASSES)
+        clock[0] += 1
+    cache.get("a")
+    clock[0] += 1
+    cache.put("c", CLASSES)
+
+    assert cache.get("b") is None
+    assert cache.get("a").classes == CLASSES
+    assert cache.get("c").classes == CLASSES
+
+
+def test_disk_tier_persists(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = TimetableCache(path)
+    cache.put("a", CLASSES, '"etag"', LAST_MODIFIED)
+    cache.close()
+
+    entry = TimetableCache(path).get("a")
+    assert (entry.classes, entry.etag, entry.last_modified) \
+        == (CLASSES, '"etag"', LAST_MODIFIED)
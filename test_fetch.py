@@ -0,0 +1,140 @@
+"""
+Tests of fetching timetables, concurrently and in batches, against a local
+stand-in of the SWS reports serving the test_data fixtures
+"""
+
+import pytest
+import requests
+
+import plot
+import test_data
+import timetable
+from benchmarks import sws
+from cache import TimetableCache
+from timetable import Timetable
+
+
+def _subjects(fixture):
+    return dict((code.upper(), classes)
+        for (_, _, code), classes in fixture)
+
+
+def _keys(fixture):
+    return [(year, semester, code.upper())
+        for (year, semester, code), _ in fixture]
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """The sessions created by Timetable.session"""
+    created = []
+    session = Timetable.session
+
+    def counting_session(*args, **kwargs):
+        created.append(session(*args, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(Timetable, "session", counting_session)
+    return created
+
+
+def test_fetch_timetables_keeps_input_order(sessions):
+    fixture = test_data.andy
+    with sws.StubServer(_subjects(fixture)) as stub:
+        keys = _keys(fixture)[::-1]
+        subject_timetables = plot.fetch_timetables(keys, max_workers = 4)
+
+    assert [key for key, _ in subject_timetables] == keys
+    expected = dict(zip(_keys(fixture), [classes for _, classes in fixture]))
+    for key, classes in subject_timetables:
+        assert classes == expected[key]
+
+    # one session, and one request per subject
+    assert len(sessions) == 1
+    assert stub.requests == len(keys)
+
+
+def test_fetch_timetables_empty():
+    assert plot.fetch_timetables([]) == []
+
+
+def test_fetch_timetables_honours_timeout():
+    fixture = test_data.two_subjects
+    with sws.StubServer(_subjects(fixture), latency = 1):
+        with pytest.raises(requests.exceptions.RequestException):
+            plot.fetch_timetables(_keys(fixture), timeout = 0.1,
+                retries = 0)
+
+
+def test_fetch_timetables_retries_server_errors():
+    fixture = test_data.two_subjects
+    with sws.StubServer(_subjects(fixture), failures = 1) as stub:
+        subject_timetables = plot.fetch_timetables(_keys(fixture)[:1],
+            retries = 1)
+
+    assert subject_timetables[0][1] == fixture[0][1]
+    assert stub.requests == 2
+
+
+def test_fetch_timetables_without_retries_fails():
+    fixture = test_data.two_subjects
+    with sws.StubServer(_subjects(fixture), failures = 1):
+        with pytest.raises(requests.exceptions.RequestException):
+            plot.fetch_timetables(_keys(fixture)[:1], retries = 0)
+
+
+SM2 = test_data.two_subjects + test_data.abpl10003_sm2
+MISSING = "NONE10001" # a subject the reports have no rows of
+
+
+def _get_many(subjects, **options):
+    return Timetable.get_many(2016, "SM2", subjects, **options)
+
+
+@pytest.mark.parametrize("options, requests", [
+    ({}, 1),
+    ({"batch_size": 3}, 2),
+    ({"batch_size": 1}, 4),
+    ({"max_url_length": 0}, 4),
+])
+def test_get_many_batches_subjects(options, requests):
+    subjects = [MISSING] + [code for _, _, code in _keys(SM2)][::-1]
+    with sws.StubServer() as stub:
+        subject_timetables = _get_many(subjects, **options)
+
+    assert stub.requests == requests
+    assert [key for key, _ in subject_timetables] \
+        == [(2016, "SM2", subject) for subject in subjects]
+    expected = dict(zip(_keys(SM2), [classes for _, classes in SM2]))
+    expected[(2016, "SM2", MISSING)] = []
+    for key, classes in subject_timetables:
+        assert classes == expected[key]
+
+
+def test_get_many_fits_the_url_length():
+    subjects = [code for _, _, code in _keys(SM2)]
+    with sws.StubServer() as stub:
+        # the link of the first two subjects, packed into one report
+        url = timetable.TIMETALBE_LINK % {"year": 2016,
+            "subject": timetable.OBJECTS_SEPARATOR.join(subjects[:2])}
+        subject_timetables = _get_many(subjects,
+            max_url_length = len(url))
+
+    assert stub.requests == 2
+    assert [classes for _, classes in subject_timetables] \
+        == [classes for _, classes in SM2]
+
+
+def test_get_many_skips_fresh_subjects():
+    cache = TimetableCache()
+    subjects = [code for _, _, code in _keys(SM2)]
+    with sws.StubServer() as stub:
+        _get_many(subjects[:2], cache = cache)
+        subject_timetables = _get_many(subjects, cache = cache,
+            batch_size = 1)
+        # and get finds them cached too
+        Timetable.get(2016, "SM2", subjects[-1], cache = cache)
+
+    assert stub.requests == 2
+    assert [classes for _, classes in subject_timetables] \
+        == [classes for _, classes in SM2]
@@ -0,0 +1,78 @@
+"""
+Tests of the layout of clashing classes, on the test_data fixtures and
+checked against a brute force
+"""
+
+import copy
+import itertools
+
+import pytest
+
+import test_data
+from benchmarks import sws
+from layout import Placement, layout_classes
+
+FIXTURES = [[class_ for _, classes in getattr(test_data, name)
+    for class_ in classes] for name in sws.FIXTURES]
+
+
+def _class(day, start, finish):
+    return {"day": day, "start": (start, 0), "finish": (finish, 0)}
+
+
+def _overlap(class_a, class_b):
+    return (class_a["day"] == class_b["day"]
+        and class_a["start"] < class_b["finish"]
+        and class_b["start"] < class_a["finish"])
+
+
+def _clusters(classes):
+    # the indexes of the classes which overlap directly or through others
+    clusters = [{index} for index in range(len(classes))]
+    for a, b in itertools.combinations(range(len(classes)), 2):
+        if _overlap(classes[a], classes[b]):
+            cluster_a = next(cluster for cluster in clusters if a in cluster)
+            cluster_b = next(cluster for cluster in clusters if b in cluster)
+            if cluster_a is not cluster_b:
+                cluster_a |= cluster_b
+                clusters.remove(cluster_b)
+
+    return clusters
+
+
+def _most_running(classes):
+    return max(sum(other["start"] <= class_["start"] < other["finish"]
+        for other in classes) for class_ in classes)
+
+
+@pytest.mark.parametrize("classes", FIXTURES + [FIXTURES[-1] * 3])
+def test_layout_classes(classes):
+    original = copy.deepcopy(classes)
+    placements = layout_classes(classes)
+    assert classes == original
+    assert len(placements) == len(classes)
+
+    for a, b in itertools.combinations(range(len(classes)), 2):
+        if _overlap(classes[a], classes[b]):
+            assert placements[a].stacking != placements[b].stacking
+
+    # each cluster takes as few lanes as possible
+    for cluster in _clusters(classes):
+        lanes = _most_running([classes[index] for index in cluster])
+        for index in cluster:
+            assert placements[index].total_stacking == lanes
+            assert 0 <= placements[index].stacking < lanes
+
+
+def test_layout_follows_input_order():
+    classes = [_class(0, 14, 15), _class(0, 11, 13), _class(0, 10, 12),
+        _class(0, 9, 11), _class(1, 10, 12)]
+
+    assert layout_classes(classes) == [Placement(0, 1), Placement(0, 2),
+        Placement(1, 2), Placement(0, 2), Placement(0, 1)]
+    assert layout_classes(classes[::-1]) \
+        == layout_classes(classes)[::-1]
+
+
+def test_layout_nothing():
+    assert layout_classes([]) == []
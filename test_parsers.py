@@ -0,0 +1,64 @@
+"""
+Tests that the lxml and BeautifulSoup row parsers agree, on reports built
+from the test_data fixtures and on cells BeautifulSoup's `.string` treats
+specially
+"""
+
+import pytest
+
+import parsers
+import test_data
+from benchmarks import sws
+
+pytest.importorskip("bs4")
+pytest.importorskip("lxml")
+
+
+def _rows(parser, content):
+    return list(parser(content))
+
+
+@pytest.mark.parametrize("name", sws.FIXTURES)
+def test_parsers_agree_on_fixtures(name):
+    fixture = getattr(test_data, name)
+    content = sws.report(dict((code.upper(), classes)
+        for (_, _, code), classes in fixture))
+
+    rows = _rows(parsers.lxml_rows, content)
+    assert rows == _rows(parsers.soup_rows, content)
+    assert len(rows) == sum(len(classes) for _, classes in fixture)
+
+
+CELLS = [
+    "<td>plain</td>",
+    "<td></td>",
+    "<td> </td>",
+    "<td><b>nested</b></td>",
+    "<td><span><i>deeply nested</i></span></td>",
+    "<td><b></b></td>",
+    "<td>text <b>and markup</b></td>",
+    "<td><b>markup</b> and text</td>",
+    "<td><b>two</b><i>elements</i></td>",
+    "<td><br></td>",
+    "<td>Alice Hoy&#8209;109 &amp; more</td>",
+    "<td>30‑38,40‑42</td>",
+]
+
+
+@pytest.mark.parametrize("cell", CELLS)
+def test_parsers_agree_on_cells(cell):
+    content = ("<html><body><table class='cyon_table'><thead><tr><th>h</th>"
+        "</tr></thead><tbody><tr>%s<td>last</td></tr></tbody></table>"
+        "</body></html>" % cell).encode("utf-8")
+
+    assert _rows(parsers.lxml_rows, content) \
+        == _rows(parsers.soup_rows, content)
+
+
+def test_parsers_skip_other_tables():
+    content = ("<html><body><table class='other'><tbody><tr><td>no</td>"
+        "</tr></tbody></table><table class='cyon_table'><tbody><tr>"
+        "<td>yes</td></tr></tbody></table></body></html>").encode("utf-8")
+
+    assert _rows(parsers.lxml_rows, content) == [["yes"]]
+    assert _rows(parsers.soup_rows, content) == [["yes"]]
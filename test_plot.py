@@ -0,0 +1,38 @@
+"""
+Tests of drawing timetables across a pool of render workers
+"""
+
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import plot
+import test_data
+
+JOBS = [test_data.two_subjects, test_data.andy, test_data.abpl10003_sm2]
+
+
+def _matplotlib_imported():
+    return "matplotlib" in sys.modules
+
+
+def test_render_worker_defers_matplotlib():
+    with ProcessPoolExecutor(max_workers = 1,
+            mp_context = multiprocessing.get_context("spawn"),
+            initializer = plot._init_render_worker) as executor:
+        assert executor.submit(_matplotlib_imported).result() is False
+
+
+@pytest.mark.parametrize("format, magic", [("svg", b"<?xml"),
+    ("png", b"\x89PNG")])
+def test_render_many(format, magic):
+    images = dict(plot.render_many(JOBS, workers = 2, format = format))
+
+    assert sorted(images) == list(range(len(JOBS)))
+    assert all(image.startswith(magic) for image in images.values())
+    if format == "svg":
+        # the same drawings as drawn in this process
+        assert [images[index] for index in range(len(JOBS))] \
+            == [plot.draw_timetable(job, format) for job in JOBS]
@@ -0,0 +1,201 @@
+"""
+Tests of the timetable server, against a local stand-in of the SWS reports
+serving the test_data fixtures
+"""
+
+import asyncio
+import http.client
+import json
+import socket
+
+import pytest
+
+import server
+import test_data
+from benchmarks import sws
+from benchmarks.server import ServerThread, fixture_keys, load, query
+from server import HTTPError, RenderCache, SingleFlight, parse_subjects
+
+SUBJECT = (2016, "SM2", "COMP20003")
+
+
+@pytest.fixture
+def stub():
+    with sws.StubServer() as stub:
+        yield stub
+
+
+def _get(port, target, headers = {}):
+    """Return the status, ETag and body of a GET of the target"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout = 30)
+    try:
+        connection.request("GET", target, headers = headers)
+        response = connection.getresponse()
+        return response.status, response.getheader("ETag"), response.read()
+    finally:
+        connection.close()
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    async def function():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", function)
+            for _ in range(10)])
+        # the key is forgotten once the call is done
+        return results, await flight.do("key", function)
+
+    results, again = asyncio.run(run())
+    assert results == [1] * 10
+    assert again == 2
+
+
+def test_concurrent_requests_share_one_fetch():
+    with sws.StubServer(latency = 0.2) as stub:
+        with ServerThread() as thread:
+            asyncio.run(load(thread.port,
+                ["/timetables?" + query([SUBJECT])] * 10, 10))
+
+    assert stub.requests == 1
+
+
+def test_render_cache_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "time", lambda: now[0])
+    cache = RenderCache(ttl = 60)
+    cache.put("key", b"image")
+
+    now[0] += 59
+    assert cache.get("key") == b"image"
+    now[0] += 1
+    assert cache.get("key") is None
+
+
+def test_render_cache_evicts_least_recently_used():
+    cache = RenderCache(entries = 2)
+    cache.put("a", b"a")
+    cache.put("b", b"b")
+    cache.get("a")
+    cache.put("c", b"c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+
+
+def test_render_cache_key_ignores_order():
+    subjects = [SUBJECT, (2016, "SM2", "MAST20026")]
+    assert RenderCache.key(subjects, "svg") \
+        == RenderCache.key(subjects[::-1], "svg")
+    assert RenderCache.key(subjects, "svg") \
+        != RenderCache.key(subjects, "png")
+
+
+def test_parse_subjects():
+    assert parse_subjects(["2016:sm2:comp20003, ,2016:SM2:MAST20026",
+        "2016:SM2:COMP20003"]) \
+        == [SUBJECT, (2016, "SM2", "MAST20026")]
+
+
+@pytest.mark.parametrize("values", [[], [""], ["COMP20003"],
+    ["2016:SM2"], ["sixteen:SM2:COMP20003"], ["2016:SM2:COMP20003:X"]])
+def test_parse_subjects_rejects(values):
+    with pytest.raises(HTTPError) as error:
+        parse_subjects(values)
+    assert error.value.status == 400
+
+
+def test_parse_subjects_limits_subjects():
+    codes = ["2016:SM2:COMP%05d" % code for code in
+        range(server.MAX_SUBJECTS + 1)]
+    assert len(parse_subjects(codes[:-1])) == server.MAX_SUBJECTS
+    with pytest.raises(HTTPError) as error:
+        parse_subjects(codes)
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "one"])
+def test_solve_rejects_bad_limits(stub, limit):
+    with ServerThread(solve_workers = 1) as thread:
+        status, _, _ = _get(thread.port, "/solve?limit=%s&%s"
+            % (limit, query(fixture_keys()[:2])))
+
+    assert status == 400
+
+
+def test_solve_clamps_limit(stub):
+    with ServerThread(solve_workers = 1) as thread:
+        status, _, body = _get(thread.port, "/solve?limit=1000&"
+            + query(fixture_keys()[:2]))
+
+    assert status == 200
+    solutions = json.loads(body)
+    assert len(solutions) == server.MAX_SOLUTIONS
+    costs = [solution["cost"] for solution in solutions]
+    assert costs == sorted(costs)
+
+
+def test_solve_times_out(stub):
+    with ServerThread(solve_workers = 1, solve_timeout = 0.1) as thread:
+        status, _, body = _get(thread.port,
+            "/solve?objective=gaps&allow_clashes=L&" + query(fixture_keys()))
+
+    assert status == 503
+    assert "0.1 seconds" in json.loads(body)["error"]
+
+
+def test_closed_connection_reaches_eof(stub):
+    # the first request starts the render workers, which must not inherit
+    # the connection and keep it open after the server closes it
+    with ServerThread(render_workers = 1) as thread:
+        with socket.create_connection(("127.0.0.1", thread.port),
+                timeout = 30) as connection:
+            connection.sendall(("GET /timetable.svg?%s HTTP/1.0\r\n\r\n"
+                % query([SUBJECT])).encode("latin-1"))
+            response = b""
+            while True:
+                chunk = connection.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Connection: close" in response
+
+
+def test_cached_drawing_answers_if_none_match(stub):
+    with ServerThread(render_workers = 1) as thread:
+        target = "/timetable.svg?" + query([SUBJECT])
+        status, etag, _ = _get(thread.port, target)
+        requests = stub.requests
+        status, again, body = _get(thread.port, target,
+            {"If-None-Match": etag})
+
+    assert (status, again, body) == (304, etag, b"")
+    assert stub.requests == requests
+
+
+def test_etag_changes_with_the_classes(stub):
+    # a drawing which has expired is drawn again from the fetched classes
+    with ServerThread(render_workers = 1,
+            render_cache = RenderCache(ttl = 0)) as thread:
+        target = "/timetable.svg?" + query([SUBJECT])
+        status, etag, _ = _get(thread.port, target)
+        assert status == 200
+        assert _get(thread.port, target, {"If-None-Match": etag})[:2] \
+            == (304, etag)
+
+        requests = stub.requests
+        stub.subjects["COMP20003"] = test_data.two_subjects[0][1][:1]
+        status, changed, body = _get(thread.port, target,
+            {"If-None-Match": etag})
+
+    assert status == 200
+    assert changed != etag and body
+    assert stub.requests > requests
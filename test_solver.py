@@ -0,0 +1,124 @@
+"""
+Tests of the solver on the test_data fixtures, checked against a brute force
+over every choice of repeats
+"""
+
+import collections
+import itertools
+
+import pytest
+
+import solver
+import test_data
+from weeks import classes_clash
+
+LIMIT = 200 # solutions checked of the fixtures with many
+
+
+def _streams(subject_timetables):
+    # the classes of each repeat of each (subject, class type)
+    streams = collections.OrderedDict()
+    for key, classes in subject_timetables:
+        for class_ in classes:
+            codes = class_["class"]
+            streams.setdefault((key, codes["class_type"]),
+                collections.OrderedDict()).setdefault(
+                    codes["class_repeat"], []).append(class_)
+
+    return streams
+
+
+def _may_clash(class_, allow_clashes):
+    return class_["class"]["class_type"].rstrip("0123456789") \
+        in allow_clashes
+
+
+def _clashes(classes, allow_clashes = ()):
+    return [(class_a, class_b)
+        for class_a, class_b in itertools.combinations(classes, 2)
+        if classes_clash(class_a, class_b)
+        and not _may_clash(class_a, allow_clashes)
+        and not _may_clash(class_b, allow_clashes)]
+
+
+def _cost(objective, classes):
+    mask = 0
+    for class_ in classes:
+        mask |= solver._class_mask(class_)
+    return solver.OBJECTIVES[objective](mask)
+
+
+def _check(subject_timetables, solutions, objective,
+allow_clashes = ()):
+    streams = _streams(subject_timetables)
+    for solution in solutions:
+        assert [key for key, _ in solution.timetables] \
+            == [key for key, _ in subject_timetables]
+
+        # exactly one whole repeat of each stream
+        chosen = _streams(solution.timetables)
+        assert set(chosen) == set(streams)
+        for stream, repeats in chosen.items():
+            assert len(repeats) == 1
+            repeat, classes = next(iter(repeats.items()))
+            assert classes == streams[stream][repeat]
+
+        classes = [class_ for _, classes in solution.timetables
+            for class_ in classes]
+        assert _clashes(classes, allow_clashes) == []
+        assert solution.cost == _cost(objective, classes)
+
+    costs = [solution.cost for solution in solutions]
+    assert costs == sorted(costs)
+
+
+@pytest.mark.parametrize("objective", solver.OBJECTIVES)
+def test_solve_matches_brute_force(objective):
+    subject_timetables = test_data.two_subjects
+    solutions = list(solver.solve(subject_timetables, objective))
+    _check(subject_timetables, solutions, objective)
+
+    costs = []
+    for choice in itertools.product(*[list(repeats.values())
+            for repeats in _streams(subject_timetables).values()]):
+        classes = [class_ for classes in choice for class_ in classes]
+        if not _clashes(classes):
+            costs.append(_cost(objective, classes))
+    assert [solution.cost for solution in solutions] == sorted(costs)
+
+
+@pytest.mark.parametrize("objective", solver.OBJECTIVES)
+def test_solve_allows_clashes(objective):
+    subject_timetables = test_data.andy
+    # the lectures, which have a repeat each, clash
+    lectures = [repeats for (_, class_type), repeats
+        in _streams(subject_timetables).items()
+        if class_type.startswith("L")]
+    assert all(len(repeats) == 1 for repeats in lectures)
+    assert _clashes([class_ for repeats in lectures
+        for classes in repeats.values() for class_ in classes])
+    assert list(solver.solve(subject_timetables, objective)) == []
+
+    solutions = list(solver.solve(subject_timetables, objective,
+        limit = LIMIT, allow_clashes = ["L"]))
+    assert len(solutions) == LIMIT
+    _check(subject_timetables, solutions, objective, ["L"])
+
+
+@pytest.mark.parametrize("limit", [0, 1, 7, 10000])
+def test_solve_honours_limit(limit):
+    solutions = list(solver.solve(test_data.two_subjects, limit = limit))
+    everything = list(solver.solve(test_data.two_subjects))
+    assert solutions == everything[:limit]
+
+
+def test_solve_nothing():
+    assert list(solver.solve([])) == [solver.Solution(0, [])]
+    key = (2016, "SM2", "COMP20003")
+    assert list(solver.solve([(key, [])])) \
+        == [solver.Solution(0, [(key, [])])]
+
+
+def test_solve_rejects_unknown_objective():
+    with pytest.raises(Exception):
+        next(solver.solve(test_data.two_subjects, "nope"))
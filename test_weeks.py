@@ -0,0 +1,104 @@
+"""
+Tests of parsing the weeks of classes, expanding them into dates, and of the
+occupancy index, on the test_data fixtures
+"""
+
+import datetime
+import itertools
+
+import pytest
+
+import solver
+import test_data
+import weeks
+from benchmarks import sws
+
+CLASSES = [class_ for name in sws.FIXTURES
+    for _, classes in getattr(test_data, name) for class_ in classes]
+
+
+def _mask(*week_numbers):
+    return sum(1 << (week - 1) for week in week_numbers)
+
+
+@pytest.mark.parametrize("weeks_string, week_numbers", [
+    ("30", [30]),
+    ("30-32", [30, 31, 32]),
+    ("30‑32,40–41", [30, 31, 32, 40, 41]), # non-breaking hyphens
+    ("1–2, 53", [1, 2, 53]), # an en dash
+    ("12,14‑16,19‑20", [12, 14, 15, 16, 19, 20]),
+    (" 9 - 10 ,", [9, 10]),
+])
+def test_parse_weeks(weeks_string, week_numbers):
+    mask = weeks.parse_weeks(weeks_string)
+    assert mask == _mask(*week_numbers)
+    assert weeks.weeks_of(mask) == week_numbers
+
+
+@pytest.mark.parametrize("weeks_string", ["week 3", "3-", "1-2-3", "0",
+    "54", "38-30", "3.5"])
+def test_parse_weeks_rejects(weeks_string):
+    with pytest.raises(Exception):
+        weeks.parse_weeks(weeks_string)
+
+
+@pytest.mark.parametrize("weeks_string", [None, "", " ", ","])
+def test_missing_weeks_are_all_weeks(weeks_string):
+    class_ = dict(CLASSES[0], weeks = weeks_string)
+    assert weeks.week_mask(class_) == weeks.ALL_WEEKS
+    assert weeks.classes_clash(class_, CLASSES[0])
+
+
+def _dates(date_ranges):
+    # e.g. "29 Feb 2016 - 21 Mar 2016, 04 Apr 2016 - 23 May 2016 ", whose
+    # ranges hold a date every week
+    dates = []
+    for date_range in date_ranges.split(","):
+        bounds = [datetime.datetime.strptime(bound.strip(), "%d %b %Y").date()
+            for bound in date_range.split(" - ")]
+        date = bounds[0]
+        while date <= bounds[-1]:
+            dates.append(date)
+            date += datetime.timedelta(weeks = 1)
+
+    return dates
+
+
+@pytest.mark.parametrize("class_", CLASSES[::7])
+def test_expand_matches_dates(class_):
+    occurrences = list(weeks.expand(class_))
+    assert [occurrence.date for occurrence in occurrences] \
+        == _dates(class_["date"])
+    assert all(occurrence.start == class_["start"]
+        and occurrence.class_ is class_ for occurrence in occurrences)
+
+
+def test_occupancy_clashes_match_brute_force():
+    pytest.importorskip("numpy")
+    index = weeks.OccupancyIndex(CLASSES)
+
+    assert index.clashes() == [(i, j)
+        for i, j in itertools.combinations(range(len(CLASSES)), 2)
+        if weeks.classes_clash(CLASSES[i], CLASSES[j])]
+    assert index.clashes(same_location = True) == [(i, j)
+        for i, j in index.clashes()
+        if CLASSES[i]["location"] == CLASSES[j]["location"]]
+
+
+def _clashing_subjects(weeks_string):
+    # two subjects of one class each, at the same time, the second in
+    # weeks given by the string
+    class_ = test_data.two_subjects[0][1][0]
+    other = dict(class_, weeks = weeks_string)
+    other["class"] = dict(class_["class"], subject = "OTHR10001")
+    return [((2016, "SM2", "COMP20003"), [class_]),
+        ((2016, "SM2", "OTHR10001"), [other])]
+
+
+@pytest.mark.parametrize("weeks_string", [None, "", "weeks 1 to 3"])
+def test_solve_keeps_clashes_of_unknown_weeks(weeks_string):
+    assert list(solver.solve(_clashing_subjects(weeks_string))) == []
+
+
+def test_solve_allows_classes_in_other_weeks():
+    assert len(list(solver.solve(_clashing_subjects("1-2")))) == 1
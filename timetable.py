@@ -10,6 +10,12 @@ TIMETALBE_LINK = ("https://sws.unimelb.edu.au/%(year)s/Reports/List.aspx"
     "?objects=%(subject)s&weeks=1-52&days=1-7&periods=1-56"
     "&template=module_by_group_list"
     )
+DEFAULT_TIMEOUT = 30 # seconds, per request
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 8
+OBJECTS_SEPARATOR = "%0D%0A" # separates subjects packed into one report
+DEFAULT_MAX_URL_LENGTH = 2000
+DEFAULT_BATCH_SIZE = 50
 
 class Timetable:
     """A scraper for the timetable of a subject"""
@@ -20,40 +26,162 @@ class Timetable:
 
 
     @staticmethod
-    def __read_subject(year, semester, subject):
+    def session(pool_size = DEFAULT_POOL_SIZE, retries = DEFAULT_RETRIES):
+        """Create a keep-alive HTTP session which can be shared by threads"""
         import requests
-        from bs4 import BeautifulSoup
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
 
-        url = Timetable.__timetable_link(year, subject)
-        page = requests.get(url)
-        soup = BeautifulSoup(page.content, "html.parser")
+        retry = Retry(total = retries, backoff_factor = 0.5,
+            status_forcelist = [500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections = pool_size,
+            pool_maxsize = pool_size, max_retries = retry)
 
-        classes = []
-        for table in soup.find_all("table", class_ = "cyon_table"):
-            for row in table.find("tbody").find_all("tr"):
-                cells = row.find_all("td")
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+    @staticmethod
+    def __fetch(url, session = None, timeout = DEFAULT_TIMEOUT, headers = None):
+        import requests
+        import metrics
+
+        with metrics.stage("fetch"):
+            page = (session or requests).get(url, headers = headers,
+                timeout = timeout)
+        # an error page must not be parsed (and cached) as a timetable
+        # without classes
+        page.raise_for_status()
+        metrics.count("bytes_fetched", len(page.content))
+        return page
+
+
+    @staticmethod
+    def __read_subject(year, semester, subject, session = None,
+    timeout = DEFAULT_TIMEOUT, cache = None, parser = None):
+        url = Timetable.__timetable_link(year, subject.upper())
+        key = (year, semester.upper(), subject.upper())
+
+        entry = None
+        headers = {}
+        if cache is not None:
+            entry = cache.get(cache.key(url, semester))
+            if entry is not None and cache.is_fresh(entry):
+                return (key, entry.classes)
+
+            # revalidate a stale entry with the validators it was stored with
+            if entry is not None and entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry is not None and entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        page = Timetable.__fetch(url, session, timeout, headers)
+        if entry is not None and headers and page.status_code == 304:
+            cache.revalidated(cache.key(url, semester))
+            return (key, entry.classes)
 
-                # Assemble the cells in the row
-                this_row = [cell.string for cell in cells]
-                class_ = dict(zip(CLASS_ROW_HEADERS, this_row))
+        classes = Timetable.__parse_page(page.content, semester, parser)
+        if cache is not None:
+            cache.put(cache.key(url, semester), classes,
+                page.headers.get("ETag"), page.headers.get("Last-Modified"))
 
-                # process the cells
-                class_["day"] = Weekday.from_string(class_["day"]).to_num()
-                class_["start"] = Time.from_string(class_["start"]).to_tuple()
-                class_["finish"] = Time.from_string(class_["finish"]).to_tuple()
-                class_["class"] = dict(zip(CLASS_CODES,
-                    class_["class"].split("/")))
+        return (key, classes)
+
+
+    @staticmethod
+    def __batches(year, subjects, max_url_length, batch_size):
+        batch = []
+        for subject in subjects:
+            candidate = batch + [subject]
+            url = Timetable.__timetable_link(year,
+                OBJECTS_SEPARATOR.join(candidate))
+            if batch and (len(candidate) > batch_size
+                    or len(url) > max_url_length):
+                yield batch
+                candidate = [subject]
+            batch = candidate
+
+        if batch:
+            yield batch
+
+
+    @staticmethod
+    def __parse_page(content, semester, parser = None):
+        import metrics
+        from parsers import get_parser
+        from records import ClassRecord
+
+        classes = []
+        rows = 0
+        with metrics.stage("parse"):
+            for this_row in get_parser(parser)(content):
+                class_ = ClassRecord.from_row(this_row)
+                rows += 1
 
                 # filter classes by semester
-                if semester.upper() == class_["class"]["semester"].upper():
+                if semester.upper() == class_.semester.upper():
                     classes.append(class_)
+        metrics.count("rows_parsed", rows)
+
+        return classes
 
-        return ((year, semester.upper(), subject.upper()), classes)
+
+    @staticmethod
+    def get(year, semester, subject, session = None,
+    timeout = DEFAULT_TIMEOUT, cache = None, parser = None):
+        key, classes = Timetable.__read_subject(year, semester, subject,
+            session, timeout, cache, parser)
+        # a copy, so the caller cannot change the list in the cache
+        return (key, list(classes))
 
 
     @staticmethod
-    def get(year, semester, subject):
-        return Timetable.__read_subject(year, semester, subject)
+    def get_many(year, semester, subjects, session = None,
+    timeout = DEFAULT_TIMEOUT, max_url_length = DEFAULT_MAX_URL_LENGTH,
+    batch_size = DEFAULT_BATCH_SIZE, cache = None, parser = None):
+        """Get the timetables of many subjects in as few requests as possible
+
+        The subjects are packed into the objects of a report, and the rows
+        of the combined report are split back out by their subject code.
+        Subjects with a fresh entry in the cache are not requested.
+        """
+        subjects = [subject.upper() for subject in subjects]
+        classes_by_subject = dict((subject, []) for subject in subjects)
+
+        pending = []
+        for subject in classes_by_subject:
+            entry = None
+            if cache is not None:
+                entry = cache.get(cache.key(
+                    Timetable.__timetable_link(year, subject), semester))
+            if entry is not None and cache.is_fresh(entry):
+                classes_by_subject[subject] = entry.classes
+            else:
+                pending.append(subject)
+
+        for batch in Timetable.__batches(year, pending,
+                max_url_length, batch_size):
+            url = Timetable.__timetable_link(year,
+                OBJECTS_SEPARATOR.join(batch))
+            page = Timetable.__fetch(url, session, timeout)
+
+            for class_ in Timetable.__parse_page(page.content, semester,
+                    parser):
+                subject = class_.subject.upper()
+                if subject in classes_by_subject:
+                    classes_by_subject[subject].append(class_)
+
+            # cache each subject under the link of its own report
+            if cache is not None:
+                for subject in batch:
+                    cache.put(cache.key(
+                        Timetable.__timetable_link(year, subject), semester),
+                        classes_by_subject[subject])
+
+        return [((year, semester.upper(), subject),
+            list(classes_by_subject[subject])) for subject in subjects]
 
 
 class Time:
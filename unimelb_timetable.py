@@ -0,0 +1,221 @@
+"""
+Command line interface for fetching, drawing and solving timetables
+
+    python -m unimelb_timetable fetch 2016:SM2:COMP20003 2016:SM2:MAST20026
+    python -m unimelb_timetable draw --input timetables.json -o out.svg
+    python -m unimelb_timetable solve --objective gaps 2016:SM1:SWEN30006
+    python -m unimelb_timetable catalogue --cache timetables.db -o subjects.cat
+    python -m unimelb_timetable serve --port 8080 --cache timetables.db
+
+Subjects are given as YEAR:SEMESTER:CODE. The modules timetable, plot and
+subject_codes are available as attributes, and are only imported on first
+use, as are their dependencies by the subcommands that need them.
+"""
+
+import sys
+
+_MODULES = ["timetable", "plot", "subject_codes"]
+
+
+def __getattr__(name):
+    # import the modules of the package lazily
+    if name in _MODULES:
+        import importlib
+        return importlib.import_module(name)
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def _subject(string):
+    import argparse
+
+    try:
+        year, semester, code = string.split(":")
+        return (int(year), semester.upper(), code.upper())
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "subject \"%s\" is not in the form YEAR:SEMESTER:CODE" % string)
+
+
+def _load_timetables(args):
+    # timetables from a file written by fetch, or fetched from the subjects
+    if args.input is not None:
+        import json
+        from records import timetables_from_json
+        with open(args.input) as input_:
+            return timetables_from_json(json.load(input_))
+
+    if not args.subjects:
+        raise SystemExit("error: no subjects or --input given")
+
+    from plot import fetch_timetables
+
+    cache = None
+    if args.cache is not None:
+        from cache import TimetableCache
+        cache = TimetableCache(args.cache)
+
+    try:
+        return fetch_timetables(args.subjects, max_workers = args.workers,
+            cache = cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _write(args, data):
+    if args.output is None or args.output == "-":
+        if isinstance(data, bytes):
+            sys.stdout.buffer.write(data)
+        else:
+            sys.stdout.write(data)
+        sys.stdout.flush()
+        return
+
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(args.output, mode) as output:
+        output.write(data)
+
+
+def _fetch(args):
+    import json
+    from records import timetables_to_json
+
+    subject_timetables = _load_timetables(args)
+    _write(args, json.dumps(timetables_to_json(subject_timetables),
+        indent = 1) + "\n")
+
+
+def _draw(args):
+    from plot import draw_timetable
+
+    subject_timetables = _load_timetables(args)
+    _write(args, draw_timetable(subject_timetables, args.format,
+        renderer = args.renderer))
+
+
+def _solve(args):
+    import itertools
+    import json
+    from records import timetables_to_json
+    from solver import solve
+
+    subject_timetables = _load_timetables(args)
+    solutions = solve(subject_timetables, args.objective,
+        allow_clashes = args.allow_clashes)
+    _write(args, json.dumps([{"cost": solution.cost,
+        "timetables": timetables_to_json(solution.timetables)}
+        for solution in itertools.islice(solutions, args.limit)],
+        indent = 1) + "\n")
+
+
+def _catalogue(args):
+    from catalogue import Catalogue
+
+    if args.output is None or args.output == "-":
+        raise SystemExit("error: the catalogue is written to a file, "
+            "give -o")
+
+    # with only a cache given, harvest every timetable in it
+    if args.input is None and not args.subjects and args.cache is not None:
+        from cache import TimetableCache
+        cache = TimetableCache(args.cache)
+        try:
+            catalogue = Catalogue.from_cache(cache)
+        finally:
+            cache.close()
+    else:
+        catalogue = Catalogue.from_timetables(_load_timetables(args))
+
+    catalogue.save(args.output)
+
+
+def _serve(args):
+    import server
+
+    cache = None
+    if args.cache is not None:
+        from cache import TimetableCache
+        cache = TimetableCache(args.cache)
+
+    try:
+        server.serve(args.host or server.DEFAULT_HOST,
+            args.port or server.DEFAULT_PORT, cache, args.workers,
+            args.render_workers)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _parser():
+    import argparse
+    import plot
+    import solver
+
+    parser = argparse.ArgumentParser(prog = "unimelb_timetable",
+        description = "Fetch, draw and solve Unimelb timetables")
+    commands = parser.add_subparsers(dest = "command")
+    commands.required = True
+
+    def add_command(name, function, help_):
+        command = commands.add_parser(name, help = help_)
+        command.set_defaults(function = function)
+        command.add_argument("subjects", nargs = "*", type = _subject,
+            metavar = "YEAR:SEMESTER:CODE")
+        command.add_argument("-i", "--input",
+            help = "read the timetables from a JSON file written by fetch")
+        command.add_argument("-o", "--output",
+            help = "write to a file instead of stdout")
+        command.add_argument("--cache",
+            help = "path of an on-disk cache of fetched timetables")
+        command.add_argument("--workers", type = int,
+            default = plot.DEFAULT_FETCH_WORKERS,
+            help = "number of subjects fetched concurrently")
+        return command
+
+    add_command("fetch", _fetch, "fetch timetables as JSON")
+
+    draw = add_command("draw", _draw, "draw timetables as an image")
+    draw.add_argument("--format", default = plot.DEFAULT_OUTPUT_FORMAT,
+        choices = plot.SUPPORTED_OUTPUT_FORMATS)
+    draw.add_argument("--renderer", default = plot.DEFAULT_RENDERER,
+        choices = plot.SUPPORTED_RENDERERS)
+
+    solve = add_command("solve", _solve,
+        "choose clash-free classes, as JSON")
+    solve.add_argument("--objective", default = solver.DEFAULT_OBJECTIVE,
+        choices = sorted(solver.OBJECTIVES))
+    solve.add_argument("--limit", type = int, default = 1,
+        help = "number of solutions, the best first")
+    solve.add_argument("--allow-clashes", action = "append", default = [],
+        metavar = "CLASS_TYPE",
+        help = "a class type which may clash, e.g. L for lectures")
+
+    add_command("catalogue", _catalogue,
+        "build an offline catalogue of the subjects, e.g. of a whole cache")
+
+    # the server is imported by the command only, as asyncio is slow to
+    # import
+    serve = commands.add_parser("serve",
+        help = "serve timetables, solutions and drawings over HTTP")
+    serve.set_defaults(function = _serve)
+    serve.add_argument("--host", help = "address to listen on")
+    serve.add_argument("--port", type = int, help = "port to listen on")
+    serve.add_argument("--cache",
+        help = "path of an on-disk cache of fetched timetables")
+    serve.add_argument("--workers", type = int,
+        default = plot.DEFAULT_FETCH_WORKERS,
+        help = "number of subjects fetched concurrently")
+    serve.add_argument("--render-workers", type = int,
+        help = "number of processes drawing and solving")
+
+    return parser
+
+
+def main(argv = None):
+    args = _parser().parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
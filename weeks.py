@@ -0,0 +1,227 @@
+"""
+Teaching weeks of classes: parsing the weeks of a class into a bit mask,
+expanding classes into their dated occurrences, and an index of the
+occupancy of rooms for clash and utilisation queries
+"""
+
+import collections
+import datetime
+import functools
+import re
+
+NUMBER_OF_WEEKS = 53
+ALL_WEEKS = (1 << NUMBER_OF_WEEKS) - 1
+DEFAULT_HOURS = (8 * 60, 18 * 60) # in minutes, of the utilisation of rooms
+DEFAULT_DAYS = range(5)
+
+# the reports separate ranges of weeks with all sorts of hyphens
+_RANGE_SEPARATOR = re.compile("[-‐‑‒–—]")
+
+Occurrence = collections.namedtuple("Occurrence",
+    ["date", "start", "finish", "class_"])
+
+
+@functools.lru_cache(maxsize = 1024)
+def parse_weeks(weeks_string):
+    """Parse weeks like "30‑38,40‑42" into a mask, with bit 0 for week 1"""
+    mask = 0
+    for part in (weeks_string or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            bounds = [int(bound) for bound in _RANGE_SEPARATOR.split(part)]
+        except ValueError:
+            raise Exception("Error while parsing weeks from string \"%s\""
+                % weeks_string)
+        if len(bounds) not in (1, 2) or not (
+                1 <= bounds[0] <= bounds[-1] <= NUMBER_OF_WEEKS):
+            raise Exception("Invalid weeks supplied in string \"%s\""
+                % weeks_string)
+
+        first, last = bounds[0], bounds[-1]
+        mask |= ((1 << (last - first + 1)) - 1) << (first - 1)
+
+    return mask
+
+
+def weeks_of(mask):
+    """The week numbers in a mask"""
+    return [week for week in range(1, NUMBER_OF_WEEKS + 1)
+        if mask >> (week - 1) & 1]
+
+
+def week_mask(class_):
+    """The mask of the weeks of a class, all of them if it lists none, as it
+    may then be held in any week"""
+    return parse_weeks(class_["weeks"]) or ALL_WEEKS
+
+
+def classes_clash(class_a, class_b):
+    """Whether two classes are at the same time in any week"""
+    return (class_a["day"] == class_b["day"]
+        and class_a["start"] < class_b["finish"]
+        and class_b["start"] < class_a["finish"]
+        and bool(week_mask(class_a) & week_mask(class_b)))
+
+
+def _year(class_):
+    # e.g. "25 Jul 2016"
+    try:
+        return int(class_["start_date"].split()[-1])
+    except (AttributeError, IndexError, ValueError):
+        raise Exception("Error while parsing year from start date \"%s\""
+            % class_["start_date"])
+
+
+def expand(class_, year = None):
+    """Yield the dated Occurrences of a class, in order
+
+    Week 1 is the week of the 4th of January (ISO 8601 weeks), which is the
+    numbering of the reports. The year is taken from the start date of the
+    class if not given.
+    """
+    if year is None:
+        year = _year(class_)
+    first_monday = datetime.date.fromisocalendar(year, 1, 1)
+
+    for week in weeks_of(week_mask(class_)):
+        date = first_monday + datetime.timedelta(weeks = week - 1,
+            days = class_["day"])
+        yield Occurrence(date, class_["start"], class_["finish"], class_)
+
+
+def building(location):
+    """The building of a location, e.g. "Alice Hoy" of
+    "Alice Hoy-109 (Comp Lab)"
+    """
+    return (location or "").split("-")[0].strip()
+
+
+class OccupancyIndex:
+    """An index of when and where classes are held, for vectorized queries
+
+    The weeks, days, times and locations of the classes are kept in NumPy
+    arrays, with each week mask in a 64-bit integer.
+    """
+
+    def __init__(self, classes):
+        import numpy
+
+        self.classes = list(classes)
+        self.week_masks = numpy.array(
+            [week_mask(class_) for class_ in self.classes], dtype = "uint64")
+        self.days = numpy.array(
+            [class_["day"] for class_ in self.classes], dtype = "uint8")
+        self.starts = numpy.array([_minutes(class_["start"])
+            for class_ in self.classes], dtype = "uint16")
+        self.finishes = numpy.array([_minutes(class_["finish"])
+            for class_ in self.classes], dtype = "uint16")
+
+        self.locations = sorted(set(class_["location"] or ""
+            for class_ in self.classes))
+        location_codes = dict((location, code)
+            for code, location in enumerate(self.locations))
+        self.location_codes = numpy.array(
+            [location_codes[class_["location"] or ""]
+                for class_ in self.classes], dtype = "int32")
+
+        self.buildings = sorted(set(building(location)
+            for location in self.locations))
+        building_codes = dict((name, code)
+            for code, name in enumerate(self.buildings))
+        self.location_buildings = numpy.array(
+            [building_codes[building(location)]
+                for location in self.locations], dtype = "int32")
+
+
+    def clashes(self, same_location = False):
+        """Return the (i, j) pairs, i < j, of the indexes of classes which
+        are at the same time in some week (and in the same location)"""
+        import numpy
+
+        pairs = []
+        for day in numpy.unique(self.days):
+            indexes = numpy.flatnonzero(self.days == day)
+            starts = self.starts[indexes]
+            finishes = self.finishes[indexes]
+            masks = self.week_masks[indexes]
+
+            clash = ((starts[:, None] < finishes[None, :])
+                & (starts[None, :] < finishes[:, None])
+                & ((masks[:, None] & masks[None, :]) != 0))
+            if same_location:
+                locations = self.location_codes[indexes]
+                clash &= locations[:, None] == locations[None, :]
+
+            first, second = numpy.nonzero(numpy.triu(clash, 1))
+            pairs += zip(indexes[first].tolist(), indexes[second].tolist())
+
+        return sorted(pairs)
+
+
+    def occupied(self, week, day, time):
+        """Return a boolean array of the classes held at the time (in
+        minutes, or as (hour, minutes)) of the day in the week"""
+        import numpy
+
+        if isinstance(time, tuple):
+            time = _minutes(time)
+        in_week = (self.week_masks >> numpy.uint64(week - 1)) \
+            & numpy.uint64(1)
+        return ((self.days == day) & (self.starts <= time)
+            & (self.finishes > time) & (in_week == 1))
+
+
+    def free_rooms(self, week, day, time):
+        """Return the locations which have no class at the time of the day
+        in the week, of all the locations of the classes"""
+        import numpy
+
+        taken = numpy.unique(
+            self.location_codes[self.occupied(week, day, time)])
+        free = numpy.ones(len(self.locations), dtype = bool)
+        free[taken] = False
+        return [self.locations[code] for code in numpy.flatnonzero(free)
+            if self.locations[code]]
+
+
+    def utilisation(self, weeks = ALL_WEEKS, days = DEFAULT_DAYS,
+    hours = DEFAULT_HOURS):
+        """Return the fraction of the room time used in each building
+
+        The room time is the hours of the days of the weeks (a mask) for
+        each location of the building.
+        """
+        import numpy
+
+        start, finish = hours
+        in_days = numpy.isin(self.days, list(days))
+        minutes = (numpy.minimum(self.finishes, finish).astype("int64")
+            - numpy.maximum(self.starts, start).astype("int64")).clip(0)
+        held_weeks = _popcount(self.week_masks & numpy.uint64(weeks))
+        used = numpy.bincount(
+            self.location_buildings[self.location_codes],
+            weights = minutes * held_weeks * in_days,
+            minlength = len(self.buildings))
+
+        rooms = numpy.bincount(self.location_buildings,
+            minlength = len(self.buildings))
+        available = (rooms * (finish - start) * len(days)
+            * bin(weeks & ALL_WEEKS).count("1"))
+
+        return dict((name, float(used[code] / available[code]))
+            for code, name in enumerate(self.buildings)
+            if name and available[code])
+
+
+def _minutes(time):
+    (hour, minutes) = time
+    return hour * 60 + minutes
+
+
+def _popcount(masks):
+    import numpy
+
+    bits = numpy.unpackbits(masks.astype("<u8").view("uint8"))
+    return bits.reshape(-1, 64).sum(axis = 1)